@@ -1,36 +1,155 @@
-class HT(object):
+import mmap
+import os
+import random
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from functools import wraps
 
-    def __init__(self, length=4):
+
+class BatchMethods(object):
+    """Bulk construction and batch lookups shared by the hash tables.
+
+    Relies on the table's reserve, addItem, getItem and __contains__. HT and
+    OpenHT override get_many and contains_many with versions that hash each
+    key once and probe their arrays directly.
+    """
+
+    @classmethod
+    def from_items(cls, items, expected_size=None):
+        """Builds a table from a mapping or iterable of (key, value) pairs,
+        sized once for expected_size (or len(items)) entries up front."""
+        table = cls()
+        if expected_size is None and hasattr(items, '__len__'):
+            expected_size = len(items)
+        if expected_size:
+            table.reserve(expected_size)
+        table.update(items)
+        return table
+
+    def update(self, items):
+        if hasattr(items, 'items'):
+            items = items.items()
+        if hasattr(items, '__len__'):
+            self.reserve(len(self) + len(items))
+        add = self.addItem
+        for key, value in items:
+            add(key, value)
+
+    def get_many(self, keys, default=None):
+        get = self.getItem
+        values = []
+        for key in keys:
+            try:
+                values.append(get(key))
+            except KeyError:
+                values.append(default)
+        return values
+
+    def contains_many(self, keys):
+        return [key in self for key in keys]
+
+
+# Stands in for a missing value in batch lookups, where None is a valid value
+_MISSING = object()
+
+
+class HT(BatchMethods):
+    """Hash table with separate chaining.
+
+    With incremental=True a resize does not rehash everything at once: the
+    old bucket array stays alive next to the new one and every addItem or
+    removeItem moves the next old buckets across, while lookups consult both
+    arrays. Each operation moves at least migrate_step buckets, and more when
+    the next resize could come due sooner, so a migration always finishes
+    before the next one starts. The table also halves itself once mass
+    deletes leave it less than an eighth full.
+    """
+
+    # Never shrinks below this many buckets
+    MIN_LENGTH = 4
+
+    def __init__(self, length=4, incremental=False, migrate_step=8):
+        if migrate_step < 1:
+            raise ValueError('migrate_step must be at least 1, got: ' + str(migrate_step))
         self.__array__ = [None] * length
+        # Entries, buckets that are not None, and the longest bucket since the
+        # last resize, so that len() and isFull() do not have to scan the array
+        self.__count__ = 0
+        self.__filled__ = 0
+        self.__longest__ = 0
+        self.__incremental__ = incremental
+        self.__migrate_step__ = migrate_step
+        # Bucket array being migrated away from, how far migration has got,
+        # and how many old buckets each operation moves
+        self.__old__ = None
+        self.__migrated__ = 0
+        self.__step__ = migrate_step
+
+    def __old_bucket(self, key):
+        if self.__old__ is None:
+            return None
+        return self.__old__[hash(key) % len(self.__old__)]
 
     def getItem(self, key):
-        length = len(self.__array__)
-        index = hash(key) % length
-        bucket = self.__array__[index]
-        if bucket:
-            for k, v in bucket:
-                if k == key:
-                    return v
-        raise KeyError('No element with key: ' + key)
+        # A key still waiting in the old array is not in the new one
+        for bucket in (self.__old_bucket(key), self.__array__[hash(key) % len(self.__array__)]):
+            if bucket:
+                for k, v in bucket:
+                    if k == key:
+                        return v
+        raise KeyError('No element with key: ' + str(key))
 
 
     def __getitem__(self, key):
         return self.getItem(key)
 
+    def __find_many(self, keys):
+        # One hash per key, with the bucket arrays and migration state read once per batch
+        buckets, old = self.__array__, self.__old__
+        length, old_length = len(buckets), len(old or ())
+        values = []
+        for key in keys:
+            key_hash = hash(key)
+            value = _MISSING
+            for bucket in (old[key_hash % old_length] if old_length else None, buckets[key_hash % length]):
+                if bucket:
+                    for k, v in bucket:
+                        if k == key:
+                            value = v
+                            break
+                    if value is not _MISSING:
+                        break
+            values.append(value)
+        return values
+
+    def get_many(self, keys, default=None):
+        return [default if value is _MISSING else value for value in self.__find_many(keys)]
+
+    def contains_many(self, keys):
+        return [value is not _MISSING for value in self.__find_many(keys)]
+
 
     def addItem(self, key, value):
+        if self.__old__ is not None:
+            self.__migrate_key(key)
+            self.__migrate(self.__step__)
         length = len(self.__array__)
         index = hash(key) % length
         bucket = self.__array__[index]
-        if not bucket:
-            self.__array__[index] = [(key, value)]
-        else:
-            for i in range(len(bucket)):
-                if bucket[i][0] == key:
-                    bucket[i] = (key, value)
-                    break
-            else:
-                bucket.append((key, value))
+        if bucket is None:
+            bucket = self.__array__[index] = []
+            self.__filled__ += 1
+        for i in range(len(bucket)):
+            if bucket[i][0] == key:
+                bucket[i] = (key, value)
+                return
+        bucket.append((key, value))
+        self.__count__ += 1
+        self.__longest__ = max(self.__longest__, len(bucket))
         if self.isFull():
             self.double()
 
@@ -39,50 +158,768 @@ class HT(object):
         self.addItem(key, value)
 
     def removeItem(self, key):
+        if self.__old__ is not None:
+            self.__migrate_key(key)
+            self.__migrate(self.__step__)
         index = hash(key) % len(self.__array__)
         bucket = self.__array__[index]
         if bucket:
             for i in range(len(bucket)):
                 if bucket[i][0] == key:
                     del bucket[i]
+                    self.__count__ -= 1
+                    break
+        length = len(self.__array__)
+        if self.__count__ < length / 8 and length > self.MIN_LENGTH:
+            self.__resize(max(length // 2, self.MIN_LENGTH))
 
     def __contains__(self, key):
-        index = hash(key) % len(self.__array__)
-        bucket = self.__array__[index]
-        if not bucket:
-            return False
-        else:
-            for k, _ in bucket:
-                if k == key:
-                    return True
+        for bucket in (self.__old_bucket(key), self.__array__[hash(key) % len(self.__array__)]):
+            if bucket:
+                for k, _ in bucket:
+                    if k == key:
+                        return True
         return False
 
     def __iter__(self):
-        for bucket in self.__array__:
-            if bucket:
-                for item in bucket:
-                    yield item
+        for buckets in (self.__old__ or (), self.__array__):
+            for bucket in buckets:
+                if bucket:
+                    for item in bucket:
+                        yield item
+
+    def __len__(self):
+        return self.__count__
 
     def isFull(self):
         """Two conditions:
             1) If more than half of the indexes are filled OR
             2) If one index has more than length/2 items
         """
-        count_full_indices = len(list([i for i in self.__array__ if i is not None]))
         table_length = len(self.__array__)
-        if count_full_indices > table_length/2:
-            return True
-        for bucket in self.__array__:
-            if bucket and len(bucket) > table_length / 2:
-                return True
-        return False
+        return self.__filled__ > table_length / 2 or self.__longest__ > table_length / 2
 
     def double(self):
-        new_table = HT(length = len(self.__array__)*2)
+        self.__resize(len(self.__array__) * 2)
+
+    def shrink(self):
+        """Resizes to the smallest length that holds the current entries."""
+        length = self.MIN_LENGTH
+        while self.__count__ >= length / 2:
+            length *= 2
+        if length < len(self.__array__):
+            self.__resize(length)
+
+    def reserve(self, n):
+        """Grows the table once so that n entries fit without further resizes."""
+        length = len(self.__array__)
+        while n >= length / 2:
+            length *= 2
+        if length > len(self.__array__):
+            self.__rehash(length)
+
+    def __resize(self, length):
+        if not self.__incremental__:
+            self.__rehash(length)
+            return
+        # Only reached mid-migration if keys collide so badly that no step is enough
+        self.__migrate(len(self.__old__ or ()))
+        self.__old__ = self.__array__
+        self.__migrated__ = 0
+        self.__array__ = [None] * length
+        self.__filled__ = self.__longest__ = 0
+        # Each operation changes the count by at most one, and filled and longest
+        # never exceed it, so at least headroom more operations come before the
+        # table can be full or, above MIN_LENGTH, an eighth full
+        headroom = length // 2 - self.__count__
+        if length > self.MIN_LENGTH:
+            headroom = min(headroom, self.__count__ - length // 8)
+        self.__step__ = max(self.__migrate_step__, -(-len(self.__old__) // max(headroom, 1)))
+
+    def __migrate(self, steps):
+        old = self.__old__
+        if old is None:
+            return
+        # Empty buckets count against steps too, so no call scans an unbounded stretch
+        index = self.__migrated__
+        end = min(index + steps, len(old))
+        while index < end:
+            if old[index] is not None:
+                self.__move_bucket(index)
+            index += 1
+        self.__migrated__ = index
+        if index == len(old):
+            self.__old__ = None
+
+    def __migrate_key(self, key):
+        index = hash(key) % len(self.__old__)
+        if self.__old__[index] is not None:
+            self.__move_bucket(index)
+
+    def __move_bucket(self, index):
+        buckets, length = self.__array__, len(self.__array__)
+        for item in self.__old__[index]:
+            new_index = hash(item[0]) % length
+            if buckets[new_index] is None:
+                buckets[new_index] = [item]
+                self.__filled__ += 1
+            else:
+                buckets[new_index].append(item)
+                self.__longest__ = max(self.__longest__, len(buckets[new_index]))
+        self.__longest__ = max(self.__longest__, 1 if self.__filled__ else 0)
+        self.__old__[index] = None
+
+    def __rehash(self, length):
+        self.__migrate(len(self.__old__ or ()))
+        buckets = [None] * length
+        filled = longest = 0
         # Re-hash all of the items in the table
         for bucket in self.__array__:
             if bucket:
-                for k, v in bucket:
-                    new_table[k] = v
-        
-        self.__array__ = new_table.__array__
+                for item in bucket:
+                    index = hash(item[0]) % length
+                    if buckets[index] is None:
+                        buckets[index] = [item]
+                        filled += 1
+                    else:
+                        buckets[index].append(item)
+                        longest = max(longest, len(buckets[index]))
+        self.__array__ = buckets
+        self.__filled__ = filled
+        self.__longest__ = max(longest, 1 if filled else 0)
+
+
+# Marks the key of a removed entry, so probe sequences walk past its slot
+_DELETED = object()
+
+# hash() never returns -1 in CPython, so it can mark a slot that was never used
+_EMPTY = -1
+
+
+class OpenHT(BatchMethods):
+    """Open-addressing variant of HT with linear probing.
+
+    Entries live in three parallel arrays (hashes, keys, values) instead of
+    lists of tuples. The number of live entries and of used slots are
+    tracked, so the load check on insert is O(1). Removed entries leave a
+    tombstone that is dropped on the next resize, and resizing reuses the
+    stored hashes instead of hashing every key again.
+    """
+
+    # Resize once live entries plus tombstones fill this share of the slots
+    MAX_LOAD = 2 / 3
+
+    def __init__(self, length=8):
+        self.__allocate(length)
+
+    def __allocate(self, length):
+        # A power-of-two length lets the probe start be a mask instead of a modulo
+        length = 1 << max(length - 1, 1).bit_length()
+        self.__hashes__ = array('q', [_EMPTY]) * length
+        self.__keys__ = [None] * length
+        self.__values__ = [None] * length
+        self.__count__ = 0
+        self.__used__ = 0
+
+    def __find(self, key, key_hash):
+        hashes, keys = self.__hashes__, self.__keys__
+        mask = len(hashes) - 1
+        index = key_hash & mask
+        while hashes[index] != _EMPTY:
+            if hashes[index] == key_hash:
+                k = keys[index]
+                if k is key or (k is not _DELETED and k == key):
+                    return index
+            index = (index + 1) & mask
+        return -1
+
+    def getItem(self, key):
+        index = self.__find(key, hash(key))
+        if index < 0:
+            raise KeyError('No element with key: ' + str(key))
+        return self.__values__[index]
+
+    def __find_many(self, keys):
+        hashes, keys_, values_ = self.__hashes__, self.__keys__, self.__values__
+        mask = len(hashes) - 1
+        values = []
+        for key in keys:
+            key_hash = hash(key)
+            index = key_hash & mask
+            value = _MISSING
+            while hashes[index] != _EMPTY:
+                if hashes[index] == key_hash:
+                    k = keys_[index]
+                    if k is key or (k is not _DELETED and k == key):
+                        value = values_[index]
+                        break
+                index = (index + 1) & mask
+            values.append(value)
+        return values
+
+    def get_many(self, keys, default=None):
+        return [default if value is _MISSING else value for value in self.__find_many(keys)]
+
+    def contains_many(self, keys):
+        return [value is not _MISSING for value in self.__find_many(keys)]
+
+    def __getitem__(self, key):
+        return self.getItem(key)
+
+    def addItem(self, key, value):
+        key_hash = hash(key)
+        hashes, keys = self.__hashes__, self.__keys__
+        mask = len(hashes) - 1
+        index = key_hash & mask
+        tombstone = -1
+        while hashes[index] != _EMPTY:
+            k = keys[index]
+            if k is _DELETED:
+                if tombstone < 0:
+                    tombstone = index
+            elif hashes[index] == key_hash and (k is key or k == key):
+                self.__values__[index] = value
+                return
+            index = (index + 1) & mask
+        if tombstone >= 0:
+            index = tombstone
+        else:
+            self.__used__ += 1
+        hashes[index] = key_hash
+        keys[index] = key
+        self.__values__[index] = value
+        self.__count__ += 1
+        if self.isFull():
+            self.double()
+
+    def __setitem__(self, key, value):
+        self.addItem(key, value)
+
+    def removeItem(self, key):
+        index = self.__find(key, hash(key))
+        if index >= 0:
+            self.__keys__[index] = _DELETED
+            self.__values__[index] = None
+            self.__count__ -= 1
+
+    def __contains__(self, key):
+        return self.__find(key, hash(key)) >= 0
+
+    def __iter__(self):
+        for key_hash, key, value in zip(self.__hashes__, self.__keys__, self.__values__):
+            if key_hash != _EMPTY and key is not _DELETED:
+                yield (key, value)
+
+    def __len__(self):
+        return self.__count__
+
+    def isFull(self):
+        return self.__used__ > len(self.__hashes__) * self.MAX_LOAD
+
+    def reserve(self, n):
+        """Resizes once so that n entries fit without further resizes."""
+        length = len(self.__hashes__)
+        while n > length * self.MAX_LOAD:
+            length *= 2
+        if length > len(self.__hashes__):
+            self.__resize(length)
+
+    def double(self):
+        # Only grow if live entries need it; a table full of tombstones just gets swept
+        length = len(self.__hashes__)
+        if self.__count__ > length * self.MAX_LOAD / 2:
+            length *= 2
+        self.__resize(length)
+
+    def __resize(self, length):
+        old_hashes, old_keys, old_values = self.__hashes__, self.__keys__, self.__values__
+        self.__allocate(length)
+        hashes, keys, values = self.__hashes__, self.__keys__, self.__values__
+        mask = len(hashes) - 1
+        count = 0
+        for key_hash, key, value in zip(old_hashes, old_keys, old_values):
+            if key_hash == _EMPTY or key is _DELETED:
+                continue
+            index = key_hash & mask
+            while hashes[index] != _EMPTY:
+                index = (index + 1) & mask
+            hashes[index] = key_hash
+            keys[index] = key
+            values[index] = value
+            count += 1
+        self.__count__ = self.__used__ = count
+
+
+class ShardedHT(BatchMethods):
+    """Thread-safe table that stripes keys across independently locked HT shards.
+
+    Writers only lock the shard their key lives in, and each shard resizes
+    on its own. With lock_free_reads, lookups first run without the lock. A
+    hit is always a real entry, since keys are compared. A miss (or a read
+    that trips over a concurrent resize) is retried under the lock, so
+    reads never report a key missing that is there.
+    """
+
+    def __init__(self, shards=16, lock_free_reads=True, **ht_options):
+        self.__shards__ = [HT(**ht_options) for _ in range(shards)]
+        self.__locks__ = [threading.Lock() for _ in range(shards)]
+        self.__lock_free_reads__ = lock_free_reads
+
+    def __shard_index(self, key):
+        # Multiplicative hashing, so that shards do not all get keys with the same
+        # residue modulo the shard count, which would crowd a few of HT's buckets
+        mixed = ((hash(key) & 0xFFFFFFFF) * 0x9E3779B1) & 0xFFFFFFFF
+        return (mixed * len(self.__shards__)) >> 32
+
+    def getItem(self, key):
+        index = self.__shard_index(key)
+        shard = self.__shards__[index]
+        if self.__lock_free_reads__:
+            try:
+                return shard.getItem(key)
+            except (KeyError, IndexError, TypeError):
+                pass
+        with self.__locks__[index]:
+            return shard.getItem(key)
+
+    def __getitem__(self, key):
+        return self.getItem(key)
+
+    def addItem(self, key, value):
+        index = self.__shard_index(key)
+        with self.__locks__[index]:
+            self.__shards__[index].addItem(key, value)
+
+    def __setitem__(self, key, value):
+        self.addItem(key, value)
+
+    def removeItem(self, key):
+        index = self.__shard_index(key)
+        with self.__locks__[index]:
+            self.__shards__[index].removeItem(key)
+
+    def __contains__(self, key):
+        index = self.__shard_index(key)
+        shard = self.__shards__[index]
+        if self.__lock_free_reads__:
+            try:
+                if key in shard:
+                    return True
+            except (IndexError, TypeError):
+                pass
+        with self.__locks__[index]:
+            return key in shard
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.__shards__)
+
+    def reserve(self, n):
+        per_shard = n // len(self.__shards__) + 1
+        for shard, lock in zip(self.__shards__, self.__locks__):
+            with lock:
+                shard.reserve(per_shard)
+
+    def snapshot(self):
+        """Returns a list of the (key, value) pairs, copying each shard under
+        its lock. Every shard is consistent, the shards are taken one after another."""
+        items = []
+        for shard, lock in zip(self.__shards__, self.__locks__):
+            with lock:
+                items.extend(shard)
+        return items
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+
+# On-disk layout of a MappedHT: header, then buckets + 1 record offsets
+# (bucket b holds records offsets[b]..offsets[b + 1] - 1), then the
+# fixed-width key + value records grouped by bucket
+_MAPPED_MAGIC = b'HTMAP001'
+_MAPPED_HEADER = struct.Struct('<8sIIQQ')
+_MAPPED_COPY_RECORDS = 2**16
+
+
+def _mapped_hash(key):
+    # Python's hash of bytes is salted per process, so files use crc32 instead
+    return zlib.crc32(key)
+
+
+def _check_width(data, width, what):
+    if not isinstance(data, (bytes, bytearray, memoryview)) or len(data) != width:
+        raise ValueError(what + ' must be ' + str(width) + ' bytes, got: ' + repr(data))
+
+
+class MappedHT(object):
+    """Read-only hash table over a memory-mapped file.
+
+    Keys and values are fixed-width bytes. The file keeps HT's layout of
+    hash % length buckets, with each chain stored as a contiguous run of
+    records, so opening is only an mmap plus a header read and processes
+    that open the same file share it through the page cache. Files are
+    written by MappedHTBuilder or save_mapped.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.__mmap__ = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, key_width, value_width, buckets, count = _MAPPED_HEADER.unpack_from(self.__mmap__)
+        if magic != _MAPPED_MAGIC:
+            self.__mmap__.close()
+            raise ValueError('Not a mapped hash table: ' + str(path))
+        self.key_width = key_width
+        self.value_width = value_width
+        self.__buckets__ = buckets
+        self.__count__ = count
+        self.__offsets__ = _MAPPED_HEADER.size
+        self.__records__ = _MAPPED_HEADER.size + 8 * (buckets + 1)
+
+    def __find(self, key):
+        _check_width(key, self.key_width, 'Key')
+        data = self.__mmap__
+        bucket = _mapped_hash(key) % self.__buckets__
+        start, end = struct.unpack_from('<QQ', data, self.__offsets__ + 8 * bucket)
+        size = self.key_width + self.value_width
+        for position in range(self.__records__ + start * size, self.__records__ + end * size, size):
+            if data[position:position + self.key_width] == key:
+                return position + self.key_width
+        return None
+
+    def getItem(self, key):
+        position = self.__find(key)
+        if position is None:
+            raise KeyError('No element with key: ' + str(key))
+        return self.__mmap__[position:position + self.value_width]
+
+    def __getitem__(self, key):
+        return self.getItem(key)
+
+    def __contains__(self, key):
+        return self.__find(key) is not None
+
+    def __iter__(self):
+        data = self.__mmap__
+        size = self.key_width + self.value_width
+        for position in range(self.__records__, self.__records__ + self.__count__ * size, size):
+            yield data[position:position + self.key_width], data[position + self.key_width:position + size]
+
+    def __len__(self):
+        return self.__count__
+
+    def close(self):
+        self.__mmap__.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class MappedHTBuilder(object):
+    """Writes a MappedHT file without holding the entries in memory.
+
+    Records are appended to a spill file next to path. finish() sizes the
+    bucket count from the number of records written, the way HT.reserve
+    sizes itself, then makes one pass over the spill file to count records
+    per bucket and a second to scatter them into the preallocated final file
+    through an mmap. The per-bucket counts, offsets and write cursors all live
+    in the offsets region of that file, so memory use stays flat however many
+    records are written. Keys are assumed to be distinct.
+    """
+
+    def __init__(self, path, key_width, value_width):
+        self.path = path
+        self.key_width = key_width
+        self.value_width = value_width
+        self.__count__ = 0
+        self.__spill_path__ = path + '.spill'
+        self.__spill__ = open(self.__spill_path__, 'wb')
+
+    def addItem(self, key, value):
+        _check_width(key, self.key_width, 'Key')
+        _check_width(value, self.value_width, 'Value')
+        self.__spill__.write(key)
+        self.__spill__.write(value)
+        self.__count__ += 1
+
+    def __spilled_buckets(self, buckets):
+        # Yields (bucket, record) for every spilled record, reading in chunks
+        size = self.key_width + self.value_width
+        with open(self.__spill_path__, 'rb') as spill:
+            chunk = spill.read(_MAPPED_COPY_RECORDS * size)
+            while chunk:
+                for position in range(0, len(chunk), size):
+                    record = chunk[position:position + size]
+                    yield _mapped_hash(record[:self.key_width]) % buckets, record
+                chunk = spill.read(_MAPPED_COPY_RECORDS * size)
+
+    def finish(self):
+        """Writes the table file, removes the spill file and returns the path."""
+        self.__spill__.close()
+        count = self.__count__
+        buckets = HT.MIN_LENGTH
+        while count >= buckets / 2:
+            buckets *= 2
+        size = self.key_width + self.value_width
+        records = _MAPPED_HEADER.size + 8 * (buckets + 1)
+        with open(self.path, 'w+b') as out:
+            out.truncate(records + count * size)
+            out.write(_MAPPED_HEADER.pack(_MAPPED_MAGIC, self.key_width, self.value_width, buckets, count))
+            data = mmap.mmap(out.fileno(), 0)
+            # The offsets are built in the file itself, so memory use does not grow with buckets
+            with memoryview(data) as view, view[_MAPPED_HEADER.size:records].cast('q') as offsets:
+                for bucket, _ in self.__spilled_buckets(buckets):
+                    offsets[bucket + 1] += 1
+                for bucket in range(buckets):
+                    offsets[bucket + 1] += offsets[bucket]
+                # offsets[b] is the write cursor of bucket b, which ends on the start of b + 1
+                for bucket, record in self.__spilled_buckets(buckets):
+                    target = records + offsets[bucket] * size
+                    data[target:target + size] = record
+                    offsets[bucket] += 1
+            # Shifting the cursors up one bucket turns them back into the starts
+            data.move(_MAPPED_HEADER.size + 8, _MAPPED_HEADER.size, 8 * (buckets - 1))
+            data[_MAPPED_HEADER.size:_MAPPED_HEADER.size + 8] = bytes(8)
+            data.flush()
+            data.close()
+        os.remove(self.__spill_path__)
+        return self.path
+
+
+def save_mapped(table, path, key_width, value_width):
+    """Saves the (key, value) pairs of table, e.g. an HT holding fixed-width
+    bytes, as a file that MappedHT can open."""
+    builder = MappedHTBuilder(path, key_width, value_width)
+    for key, value in table:
+        builder.addItem(key, value)
+    return builder.finish()
+
+
+def _sizeof(obj):
+    """Size in bytes of obj plus, for the builtin containers, of what it holds."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_sizeof(k) + _sizeof(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_sizeof(item) for item in obj)
+    return size
+
+
+class _CacheNode(object):
+    __slots__ = ('key', 'value', 'size', 'freq', 'prev', 'next')
+
+    def __init__(self, key=None, value=None, size=0):
+        self.key = key
+        self.value = value
+        self.size = size
+        self.freq = 1
+        # A lone node is the empty circular list it is the sentinel of
+        self.prev = self.next = self
+
+
+def _unlink(node):
+    node.prev.next = node.next
+    node.next.prev = node.prev
+
+
+def _push_front(head, node):
+    node.prev = head
+    node.next = head.next
+    head.next.prev = node
+    head.next = node
+
+
+class Cache(object):
+    """Bounded cache: an HT from key to node plus intrusive linked lists.
+
+    With policy 'lru' all nodes sit in one list, most recently used first.
+    With policy 'lfu' there is one list per use count, kept in a second HT,
+    and the least recently used node of the lowest count is evicted. get,
+    put and evict are all O(1). Entries are evicted once there are more
+    than max_entries of them or their keys and values (as measured by
+    _sizeof) take more than max_bytes; a value bigger than max_bytes on its
+    own is not cached at all.
+    """
+
+    POLICIES = ('lru', 'lfu')
+
+    def __init__(self, max_entries=None, max_bytes=None, policy='lru'):
+        if policy not in self.POLICIES:
+            raise ValueError('Unknown cache policy: ' + str(policy))
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.clear()
+
+    def clear(self):
+        self.__nodes__ = HT()
+        # Use count -> list sentinel; the LRU policy only ever uses count 1
+        self.__lists__ = HT()
+        self.__min_freq__ = 1
+        self.__bytes__ = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def __list(self, freq):
+        try:
+            return self.__lists__.getItem(freq)
+        except KeyError:
+            head = _CacheNode()
+            self.__lists__.addItem(freq, head)
+            return head
+
+    def __detach(self, node):
+        _unlink(node)
+        head = self.__lists__.getItem(node.freq)
+        if head.next is head:
+            self.__lists__.removeItem(node.freq)
+            if self.__min_freq__ == node.freq:
+                self.__min_freq__ += 1
+
+    def __touch(self, node):
+        if self.policy == 'lru':
+            _unlink(node)
+            _push_front(self.__list(1), node)
+            return
+        self.__detach(node)
+        node.freq += 1
+        _push_front(self.__list(node.freq), node)
+
+    def __evict(self):
+        # Removals can leave the minimum stale; it is only looked up again here,
+        # over the use counts that still have a list
+        if self.__min_freq__ not in self.__lists__:
+            self.__min_freq__ = min(freq for freq, _ in self.__lists__)
+        node = self.__lists__.getItem(self.__min_freq__).prev
+        self.__remove(node)
+        self.evictions += 1
+
+    def __remove(self, node):
+        self.__detach(node)
+        self.__nodes__.removeItem(node.key)
+        self.__bytes__ -= node.size
+
+    def getItem(self, key):
+        try:
+            node = self.__nodes__.getItem(key)
+        except KeyError:
+            self.misses += 1
+            raise
+        self.hits += 1
+        self.__touch(node)
+        return node.value
+
+    def __getitem__(self, key):
+        return self.getItem(key)
+
+    def get(self, key, default=None):
+        try:
+            return self.getItem(key)
+        except KeyError:
+            return default
+
+    def addItem(self, key, value):
+        size = _sizeof(key) + _sizeof(value) if self.max_bytes is not None else 0
+        if key in self.__nodes__:
+            self.__remove(self.__nodes__.getItem(key))
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        # Make room first, so that under LFU the new entry is not the one evicted
+        while self.max_entries is not None and len(self.__nodes__) >= self.max_entries > 0:
+            self.__evict()
+        while self.max_bytes is not None and self.__bytes__ + size > self.max_bytes:
+            self.__evict()
+        if self.max_entries == 0:
+            return
+        node = _CacheNode(key, value, size)
+        self.__nodes__.addItem(key, node)
+        self.__bytes__ += size
+        self.__min_freq__ = 1
+        _push_front(self.__list(1), node)
+
+    def __setitem__(self, key, value):
+        self.addItem(key, value)
+
+    def removeItem(self, key):
+        self.__remove(self.__nodes__.getItem(key))
+
+    def __contains__(self, key):
+        # Does not count as a use, nor as a hit or miss
+        return key in self.__nodes__
+
+    def __len__(self):
+        return len(self.__nodes__)
+
+    def nbytes(self):
+        return self.__bytes__
+
+
+def memoize(max_entries=1024, max_bytes=None, policy='lru'):
+    """Decorator that caches a function's results in a bounded Cache, e.g.
+
+        cached_factors = memoize(max_entries=10000)(prime_functions.prime_factors)
+
+    The cache is exposed as the wrapper's cache attribute. Calls with
+    unhashable arguments are passed straight through. Cached results are
+    shared between callers, so results such as sets should not be mutated.
+    """
+    def decorator(func):
+        cache = Cache(max_entries, max_bytes, policy)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (args, frozenset(kwargs.items())) if kwargs else args
+            try:
+                return cache.getItem(key)
+            except KeyError:
+                pass
+            except TypeError:
+                return func(*args, **kwargs)
+            result = func(*args, **kwargs)
+            cache.addItem(key, result)
+            return result
+
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+def contention_benchmark(table, threads=4, operations=100000, read_ratio=0.9, key_space=10000):
+    """Runs threads that each do operations random reads and writes on table
+    and returns the total throughput in operations per second."""
+    for key in range(key_space):
+        table[key] = key
+    start = threading.Barrier(threads + 1)
+
+    def worker(seed):
+        rng = random.Random(seed)
+        keys = [rng.randrange(key_space) for _ in range(operations)]
+        reads = [rng.random() < read_ratio for _ in range(operations)]
+        start.wait()
+        for key, read in zip(keys, reads):
+            if read:
+                table.getItem(key)
+            else:
+                table.addItem(key, key)
+
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    for thread in workers:
+        thread.start()
+    start.wait()
+    began = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    return threads * operations / (time.perf_counter() - began)
+
+
+def main():
+    print("Contention benchmark (operations per second, 90% reads)")
+    for threads in (1, 2, 4, 8):
+        # One shard behind one lock is the same as wrapping a whole HT in a lock
+        single_lock = contention_benchmark(ShardedHT(shards=1, lock_free_reads=False), threads=threads)
+        sharded = contention_benchmark(ShardedHT(shards=16), threads=threads)
+        print('Threads: ', threads, ' single lock: ', round(single_lock), ' sharded: ', round(sharded))
+
+
+if __name__ == "__main__":
+    main()
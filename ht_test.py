@@ -0,0 +1,528 @@
+import itertools
+import os
+import random
+import tempfile
+import threading
+import time
+import unittest
+from array import array
+from collections import Counter, OrderedDict
+from ht import *
+from ht import _MAPPED_HEADER, _mapped_hash
+
+
+class Collider(object):
+    # Distinct keys that all share one hash, to force long probe sequences
+    def __init__(self, n):
+        self.n = n
+
+    def __hash__(self):
+        return 42
+
+    def __eq__(self, other):
+        return isinstance(other, Collider) and self.n == other.n
+
+    def __repr__(self):
+        return 'Collider(' + str(self.n) + ')'
+
+
+class HTTestCase(unittest.TestCase):
+
+    def check_table(self, table, expected):
+        self.assertEqual(len(table), len(expected))
+        self.assertEqual(dict(table), expected)
+        self.assertEqual(sorted(table, key=repr), sorted(expected.items(), key=repr))
+
+    def assert_no_resize_mid_migration(self, table):
+        # Wraps the table's resize to check that the previous migration has always finished
+        resize, resizes = table._HT__resize, []
+        def checked_resize(length):
+            self.assertIsNone(table.__old__)
+            resizes.append(length)
+            resize(length)
+        table._HT__resize = checked_resize
+        return resizes
+
+    def random_operations(self, table, seed):
+        rng = random.Random(seed)
+        expected = {}
+        migrating = 0
+        for step in range(20000):
+            key = rng.randrange(1000)
+            r = rng.random()
+            if r < 0.5:
+                table[key] = step
+                expected[key] = step
+            elif r < 0.8:
+                table.removeItem(key)
+                expected.pop(key, None)
+            elif key in expected:
+                self.assertEqual(table[key], expected[key])
+            else:
+                self.assertNotIn(key, table)
+                with self.assertRaises(KeyError):
+                    table.getItem(key)
+            if table.__old__ is not None:
+                migrating += 1
+            if step % 500 == 0:
+                self.check_table(table, expected)
+        self.check_table(table, expected)
+        return migrating
+
+    def test_random_operations(self):
+        self.assertEqual(self.random_operations(HT(), 16), 0)
+
+    def test_incremental_random_operations(self):
+        # Lookups, inserts and removes must see keys wherever the migration has left them
+        for seed, table in [(16, HT(incremental=True)), (17, HT(incremental=True, migrate_step=1))]:
+            resizes = self.assert_no_resize_mid_migration(table)
+            self.assertGreater(self.random_operations(table, seed), 0)
+            self.assertTrue(resizes)
+        with self.assertRaises(ValueError):
+            HT(incremental=True, migrate_step=0)
+
+    def test_incremental_migration_finishes_before_next_resize(self):
+        # Even one bucket per operation is stepped up to fit the headroom, growing and shrinking
+        rng = random.Random(5)
+        keys = rng.sample(range(10**9), 300000)
+        table = HT(incremental=True, migrate_step=1)
+        resizes = self.assert_no_resize_mid_migration(table)
+        for key in keys:
+            table[key] = key
+        grown = len(resizes)
+        self.assertGreater(grown, 15)
+        for key in keys:
+            table.removeItem(key)
+        self.assertGreater(len(resizes), grown + 10)
+        self.assertEqual(len(table), 0)
+
+    def test_incremental_resize_is_spread_out(self):
+        table = HT(incremental=True, migrate_step=2)
+        resizes = self.assert_no_resize_mid_migration(table)
+        # Stop right after the fourth resize, which leaves 16 old buckets to migrate
+        n = 0
+        while len(resizes) < 4:
+            table[n] = n
+            n += 1
+        self.assertIsNotNone(table.__old__)
+        # Entries still waiting in the old array are found, replaced and removed there
+        waiting = [k for bucket in table.__old__ if bucket for k, _ in bucket]
+        self.assertTrue(waiting)
+        key = waiting[-1]
+        self.assertIn(key, table)
+        table[key] = 'new'
+        self.assertEqual(table[key], 'new')
+        table.removeItem(waiting[-2])
+        self.assertNotIn(waiting[-2], table)
+        expected = {k: k for k in range(n)}
+        expected[key] = 'new'
+        del expected[waiting[-2]]
+        self.check_table(table, expected)
+
+    def test_shrink_on_remove(self):
+        for incremental in (False, True):
+            table = HT(incremental=incremental)
+            for key in range(256):
+                table[key] = key
+            while table.__old__ is not None:
+                table[0] = 0
+            length = len(table.__array__)
+            # Shrinks to half once fewer than length / 8 entries are left
+            keys = list(range(256))
+            while len(table) > length // 8:
+                table.removeItem(keys.pop())
+            self.assertEqual(len(table.__array__), length)
+            table.removeItem(keys.pop())
+            self.assertEqual(len(table.__array__), length // 2)
+            self.check_table(table, {key: key for key in keys})
+
+    def test_shrink_to_fit(self):
+        table = HT()
+        for key in range(1000):
+            table[key] = key
+        for key in range(990):
+            table.removeItem(key)
+        table.shrink()
+        self.assertLessEqual(len(table.__array__), 32)
+        self.assertGreater(len(table.__array__) / 2, len(table))
+        self.check_table(table, {key: key for key in range(990, 1000)})
+        for key in range(990, 1000):
+            table.removeItem(key)
+        self.assertEqual(len(table.__array__), HT.MIN_LENGTH)
+
+    def test_reserve(self):
+        table = HT()
+        table.reserve(1000)
+        length = len(table.__array__)
+        for key in range(1000):
+            table[key] = key
+        self.assertEqual(len(table.__array__), length)
+
+
+class OpenHTTestCase(unittest.TestCase):
+
+    def test_random_operations(self):
+        rng = random.Random(14)
+        table, expected = OpenHT(), {}
+        for step in range(20000):
+            key = rng.randrange(500)
+            if rng.random() < 0.6:
+                table[key] = step
+                expected[key] = step
+            else:
+                table.removeItem(key)
+                expected.pop(key, None)
+            if step % 1000 == 0:
+                self.assertEqual(dict(table), expected)
+        self.assertEqual(len(table), len(expected))
+        self.assertEqual(dict(table), expected)
+        for key in range(500):
+            self.assertEqual(key in table, key in expected)
+
+    def test_get_missing(self):
+        table = OpenHT()
+        with self.assertRaises(KeyError):
+            table.getItem('missing')
+        table.removeItem('missing')
+        self.assertEqual(len(table), 0)
+
+    def test_none_key(self):
+        table = OpenHT()
+        table[None] = 1
+        self.assertEqual(table[None], 1)
+        self.assertEqual(list(table), [(None, 1)])
+
+    def test_probing_past_tombstones(self):
+        table = OpenHT()
+        for n in range(10):
+            table[Collider(n)] = n
+        # Removing from the middle of the probe run must not hide the keys after it
+        table.removeItem(Collider(3))
+        table.removeItem(Collider(4))
+        self.assertNotIn(Collider(3), table)
+        for n in [0, 1, 2, 5, 6, 7, 8, 9]:
+            self.assertEqual(table[Collider(n)], n)
+        # A re-added key goes into a tombstone and is still found only once
+        table[Collider(5)] = 50
+        table[Collider(3)] = 30
+        self.assertEqual(table[Collider(5)], 50)
+        self.assertEqual(table[Collider(3)], 30)
+        self.assertEqual(sorted(n.n for n, _ in table), [0, 1, 2, 3, 5, 6, 7, 8, 9])
+        self.assertEqual(len(table), 9)
+
+    def test_tombstone_reuse_and_sweep(self):
+        table = OpenHT()
+        for key in range(4):
+            table[key] = key
+        # Churn through many distinct keys with only a few live at once; once
+        # the table has room for the live keys, tombstones are swept, not grown past
+        for key in range(4, 100):
+            table[key] = key
+            table.removeItem(key)
+        length = len(table.__hashes__)
+        for key in range(100, 10000):
+            table[key] = key
+            table.removeItem(key)
+        self.assertEqual(len(table.__hashes__), length)
+        self.assertEqual(dict(table), {0: 0, 1: 1, 2: 2, 3: 3})
+
+    def test_resize_keeps_entries(self):
+        table = OpenHT()
+        for key in range(1000):
+            table[str(key)] = key
+        self.assertGreaterEqual(len(table.__hashes__) * OpenHT.MAX_LOAD, 1000)
+        self.assertEqual(dict(table), {str(key): key for key in range(1000)})
+
+    def test_reserve(self):
+        table = OpenHT()
+        table.reserve(1000)
+        length = len(table.__hashes__)
+        for key in range(1000):
+            table[key] = key
+        self.assertEqual(len(table.__hashes__), length)
+        self.assertEqual(len(table), 1000)
+
+
+class BatchMethodsTestCase(unittest.TestCase):
+
+    def check_batch(self, table, expected):
+        keys = list(range(-50, 650)) + [None, 'x']
+        self.assertEqual(table.get_many(keys), [expected.get(key) for key in keys])
+        self.assertEqual(table.get_many(keys, default='missing'), [expected.get(key, 'missing') for key in keys])
+        self.assertEqual(table.contains_many(keys), [key in expected for key in keys])
+
+    def test_from_items_and_batches(self):
+        expected = {key: key * key for key in range(500)}
+        # None values must come back as values, not as misses
+        expected[None] = None
+        expected[600] = None
+        for cls in (HT, OpenHT):
+            table = cls.from_items(expected)
+            self.assertEqual(len(table), len(expected))
+            self.assertEqual(dict(table), expected)
+            self.check_batch(table, expected)
+
+    def test_from_pairs_and_update(self):
+        for cls in (HT, OpenHT):
+            table = cls.from_items(((key, -key) for key in range(100)), expected_size=100)
+            table.update({key: key for key in range(50, 150)})
+            table.update([(200, 'a'), (201, 'b')])
+            expected = {key: -key for key in range(50)}
+            expected.update({key: key for key in range(50, 150)})
+            expected.update({200: 'a', 201: 'b'})
+            self.assertEqual(dict(table), expected)
+            self.check_batch(table, expected)
+
+    def test_batches_during_migration(self):
+        table = HT(incremental=True, migrate_step=2)
+        expected = {}
+        for key in range(300):
+            table[key] = str(key)
+            expected[key] = str(key)
+            if key % 37 == 0:
+                self.check_batch(table, expected)
+
+
+class ShardedHTTestCase(unittest.TestCase):
+
+    def test_random_operations(self):
+        rng = random.Random(17)
+        table, expected = ShardedHT(shards=8, incremental=True), {}
+        for step in range(10000):
+            key = rng.randrange(500)
+            if rng.random() < 0.6:
+                table[key] = step
+                expected[key] = step
+            else:
+                table.removeItem(key)
+                expected.pop(key, None)
+        self.assertEqual(len(table), len(expected))
+        self.assertEqual(dict(table.snapshot()), expected)
+        self.assertEqual(dict(iter(table)), expected)
+        keys = list(range(600))
+        self.assertEqual(table.get_many(keys), [expected.get(key) for key in keys])
+        self.assertEqual(table.contains_many(keys), [key in expected for key in keys])
+        with self.assertRaises(KeyError):
+            table.getItem(1000)
+
+    def test_keys_spread_over_shards(self):
+        table = ShardedHT(shards=16)
+        for key in range(1600):
+            table[key] = key
+        sizes = [len(shard) for shard in table.__shards__]
+        self.assertTrue(all(50 < size < 150 for size in sizes), sizes)
+
+    def test_concurrent_readers_never_miss(self):
+        table = ShardedHT(shards=4)
+        for key in range(500):
+            table[key] = key
+        errors = []
+
+        def writer(seed):
+            rng = random.Random(seed)
+            for _ in range(5000):
+                # Churn other keys to force resizes while stable keys are rewritten
+                table[rng.randrange(500)] = rng.randrange(500)
+                table[500 + rng.randrange(5000)] = 0
+                table.removeItem(500 + rng.randrange(5000))
+
+        def reader(seed):
+            rng = random.Random(seed)
+            for _ in range(10000):
+                key = rng.randrange(500)
+                try:
+                    table.getItem(key)
+                except KeyError:
+                    errors.append(key)
+                if key not in table:
+                    errors.append(key)
+
+        threads = [threading.Thread(target=writer, args=(seed,)) for seed in range(2)]
+        threads += [threading.Thread(target=reader, args=(seed,)) for seed in range(2, 4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertTrue(all(key in table for key in range(500)))
+
+
+class MappedHTTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'table.ht')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_save_and_open(self):
+        table = HT()
+        expected = {}
+        for n in range(2000):
+            key, value = n.to_bytes(4, 'little'), (n * n).to_bytes(8, 'little')
+            table[key] = value
+            expected[key] = value
+        save_mapped(table, self.path, 4, 8)
+        self.assertEqual(os.listdir(self.directory.name), ['table.ht'])
+        with MappedHT(self.path) as mapped:
+            self.assertEqual(len(mapped), 2000)
+            self.assertEqual(dict(mapped), expected)
+            for key, value in expected.items():
+                self.assertEqual(mapped[key], value)
+            self.assertNotIn((5000).to_bytes(4, 'little'), mapped)
+            with self.assertRaises(KeyError):
+                mapped.getItem((5000).to_bytes(4, 'little'))
+            with self.assertRaises(ValueError):
+                mapped.getItem(b'short')
+
+    def test_builder_sizes_buckets_from_records(self):
+        builder = MappedHTBuilder(self.path, 8, 2)
+        for n in range(20000):
+            builder.addItem(n.to_bytes(8, 'little'), b'ok')
+        with self.assertRaises(ValueError):
+            builder.addItem(b'12345678', b'too long')
+        builder.finish()
+        with MappedHT(self.path) as mapped:
+            # As many buckets as HT would use, so chains stay short without a size hint
+            self.assertGreater(mapped.__buckets__, 2 * len(mapped))
+            self.assertEqual(len(mapped), 20000)
+            self.assertTrue(all(mapped[n.to_bytes(8, 'little')] == b'ok' for n in range(0, 20000, 7)))
+            buckets = mapped.__buckets__
+        # The offsets built in place in the file match the bucket sizes
+        with open(self.path, 'rb') as f:
+            f.seek(_MAPPED_HEADER.size)
+            offsets = array('q', f.read(8 * (buckets + 1)))
+        sizes = Counter(_mapped_hash(n.to_bytes(8, 'little')) % buckets for n in range(20000))
+        self.assertEqual(list(offsets), [0] + list(itertools.accumulate(sizes[b] for b in range(buckets))))
+
+    def test_empty_table(self):
+        MappedHTBuilder(self.path, 2, 2).finish()
+        with MappedHT(self.path) as mapped:
+            self.assertEqual(len(mapped), 0)
+            self.assertEqual(list(mapped), [])
+            self.assertNotIn(b'ab', mapped)
+
+    def test_not_a_table(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'\0' * 64)
+        with self.assertRaises(ValueError):
+            MappedHT(self.path)
+
+
+class ReferenceLFU(object):
+    # Brute force LFU: evicts the lowest use count, least recently used first
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = {}
+        self.clock = 0
+
+    def get(self, key):
+        if key not in self.entries:
+            return 'missing'
+        self.clock += 1
+        value, uses, _ = self.entries[key]
+        self.entries[key] = (value, uses + 1, self.clock)
+        return value
+
+    def put(self, key, value):
+        self.clock += 1
+        self.entries.pop(key, None)
+        if len(self.entries) >= self.max_entries:
+            del self.entries[min(self.entries, key=lambda k: self.entries[k][1:])]
+        self.entries[key] = (value, 1, self.clock)
+
+
+class CacheTestCase(unittest.TestCase):
+
+    def test_lru_matches_ordered_dict(self):
+        rng = random.Random(19)
+        cache, expected, evictions = Cache(max_entries=50), OrderedDict(), 0
+        hits = 0
+        for step in range(20000):
+            key = rng.randrange(120)
+            if rng.random() < 0.5:
+                self.assertEqual(cache.get(key, 'missing'), expected.get(key, 'missing'))
+                if key in expected:
+                    expected.move_to_end(key)
+                    hits += 1
+            else:
+                expected.pop(key, None)
+                expected[key] = step
+                if len(expected) > 50:
+                    expected.popitem(last=False)
+                    evictions += 1
+                cache[key] = step
+            self.assertEqual(len(cache), len(expected))
+        self.assertEqual(cache.evictions, evictions)
+        self.assertEqual(cache.hits, hits)
+
+    def test_lfu_matches_reference(self):
+        rng = random.Random(20)
+        cache, expected = Cache(max_entries=30, policy='lfu'), ReferenceLFU(30)
+        hits = misses = 0
+        for step in range(20000):
+            key = rng.randrange(80)
+            r = rng.random()
+            if r < 0.6:
+                value = expected.get(key)
+                hits, misses = hits + (value != 'missing'), misses + (value == 'missing')
+                self.assertEqual(cache.get(key, 'missing'), value)
+            elif r < 0.65:
+                if key in expected.entries:
+                    cache.removeItem(key)
+                    del expected.entries[key]
+            else:
+                cache[key] = step
+                expected.put(key, step)
+            self.assertEqual(len(cache), len(expected.entries))
+        self.assertEqual((cache.hits, cache.misses), (hits, misses))
+
+    def test_lfu_keeps_hot_key_and_evicts_in_constant_time(self):
+        cache = Cache(max_entries=2, policy='lfu')
+        cache['hot'] = 1
+        for _ in range(200000):
+            cache['hot']
+        start = time.perf_counter()
+        for key in range(20):
+            cache[key] = key
+        # Used to scan every use count up to the hot key's, taking seconds
+        self.assertLess(time.perf_counter() - start, 0.1)
+        self.assertIn('hot', cache)
+        self.assertIn(19, cache)
+        self.assertEqual(cache.evictions, 19)
+
+    def test_max_bytes(self):
+        cache = Cache(max_bytes=2000)
+        for key in range(100):
+            cache[key] = list(range(10))
+        self.assertLessEqual(cache.nbytes(), 2000)
+        self.assertIn(99, cache)
+        self.assertNotIn(0, cache)
+        # Too big to cache at all, and does not flush what is there
+        cache['big'] = list(range(1000))
+        self.assertNotIn('big', cache)
+        self.assertIn(99, cache)
+
+    def test_bad_policy(self):
+        with self.assertRaises(ValueError):
+            Cache(policy='fifo')
+
+    def test_memoize(self):
+        calls = []
+
+        @memoize(max_entries=2)
+        def square(n, offset=0):
+            calls.append(n)
+            return n * n + offset
+
+        self.assertEqual([square(2), square(2), square(3), square(2, offset=1)], [4, 4, 9, 5])
+        self.assertEqual(calls, [2, 3, 2])
+        self.assertEqual((square.cache.hits, square.cache.misses), (1, 3))
+        self.assertEqual(square.__name__, 'square')
+        # Unhashable arguments skip the cache
+        self.assertEqual(memoize()(len)([1, 2]), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,14 @@
-import queue
+import heapq
+from array import array
+from bisect import bisect_left
+from collections import deque
 from functools import reduce
 
+import numpy as np
+
 
 class NaryTreeNode(object):
+    __slots__ = ('__val__', '__children__')
 
     def __init__(self, value, children = None):
         if not children:
@@ -20,8 +26,7 @@ class NaryTreeNode(object):
         for child in self.__children__:
             if child.__val__ == value:
                 return child
-        else:
-            return KeyError('No child with value: ', value)
+        raise KeyError('No child with value: ' + str(value))
     
     def __iter__(self):
         for child in self.__children__:
@@ -29,15 +34,155 @@ class NaryTreeNode(object):
 
 
     def remove_child(self, value):
-        for i in range(len(self.__children__)):
-            child = self.__children__[i]
+        # Removes the first child with value
+        for i, child in enumerate(self.__children__):
             if child.__val__ == value:
                 del self.__children__[i]
-                print('Child with value: ', value, ' deleted')
+                return
+        raise KeyError('No child with value: ' + str(value))
+
+class FlatTree(object):
+    """Tree stored as flat int arrays instead of node objects.
+
+    parents[i] is the parent of node i (-1 for the root). The children of
+    node i are children[child_start[i]:child_start[i + 1]], in index order.
+    tin[i] is node i's position in a pre-order walk (its Euler tour entry
+    time) and sizes[i] the size of its subtree, so the subtree of i is the
+    nodes whose tin falls in [tin[i], tin[i] + sizes[i]). That makes subtree
+    size and ancestor checks O(1). At 4 bytes per array entry a 10^7 node
+    tree takes about 200 MB plus its values.
+    """
+
+    def __init__(self, parents, values=None):
+        parents = np.asarray(parents, dtype=np.int64)
+        n = len(parents)
+        roots = np.flatnonzero(parents < 0)
+        if len(roots) != 1:
+            raise ValueError('A tree needs exactly one root, got: ' + str(len(roots)))
+        if n and parents.max() >= n:
+            raise ValueError('Parent index out of range: ' + str(parents.max()))
+        self.root = int(roots[0])
+        self.parents = parents.astype(np.int32)
+        self.values = np.arange(n, dtype=np.int32) if values is None else np.asarray(values)
+        if len(self.values) != n:
+            raise ValueError('Need one value per node')
+        # A stable sort by parent groups siblings together in index order, root first
+        self.children = np.argsort(parents, kind='stable')[1:].astype(np.int32)
+        self.child_start = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(np.bincount(parents[parents >= 0], minlength=n), out=self.child_start[1:])
+        self.tin, self.sizes = self.__euler_tour()
+        self.__index = None
+
+    def __euler_tour(self):
+        n = len(self.parents)
+        # array keeps the walk's working memory at 4 bytes a node
+        children = array('i', self.children.tobytes())
+        start = array('i', self.child_start.tobytes())
+        parents = array('i', self.parents.tobytes())
+        order = array('i')
+        stack = array('i', [self.root])
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            stack.extend(reversed(children[start[node]:start[node + 1]]))
+        if len(order) != n:
+            raise ValueError('Parent array has a cycle')
+        sizes = array('i', [1]) * n
+        for node in reversed(order):
+            parent = parents[node]
+            if parent >= 0:
+                sizes[parent] += sizes[node]
+        order = np.frombuffer(order, dtype=np.int32)
+        tin = np.empty(n, dtype=np.int32)
+        tin[order] = np.arange(n, dtype=np.int32)
+        return tin, np.frombuffer(sizes, dtype=np.int32).copy()
+
+    @classmethod
+    def from_parents(cls, parents, values=None):
+        return cls(parents, values)
+
+    @classmethod
+    def from_nary(cls, root):
+        """Flattens a tree of NaryTreeNode, numbering nodes in level order."""
+        parents = [-1]
+        values = [root.get_value()]
+        q = deque([(root, 0)])
+        while q:
+            node, index = q.popleft()
+            for child in node:
+                q.append((child, len(parents)))
+                parents.append(index)
+                values.append(child.get_value())
+        return cls(parents, values)
+
+    def __len__(self):
+        return len(self.parents)
+
+    def get_children(self, node):
+        return self.children[self.child_start[node]:self.child_start[node + 1]]
+
+    def build_index(self):
+        """Builds the (parent, value) -> node dict that makes get_child O(1)."""
+        keys = list(zip(self.parents.tolist(), self.values.tolist()))
+        # Filled back to front so that, like the scan, the first sibling with a value wins
+        self.__index = dict(zip(reversed(keys), range(len(keys) - 1, -1, -1)))
+
+    def get_child(self, node, value):
+        if self.__index is not None:
+            child = self.__index.get((node, value))
         else:
-            print('No child with value: ', value)
+            children = self.get_children(node)
+            matches = np.flatnonzero(self.values[children] == value)
+            child = int(children[matches[0]]) if len(matches) else None
+        if child is None:
+            raise KeyError('No child with value: ' + str(value))
+        return child
+
+    def subtree_size(self, node):
+        return int(self.sizes[node])
+
+    def is_ancestor(self, ancestor, node):
+        # Every node counts as its own ancestor
+        return self.tin[ancestor] <= self.tin[node] < self.tin[ancestor] + self.sizes[ancestor]
+
+    def get_root(self):
+        return FlatTreeNode(self, self.root)
+
+class FlatTreeNode(object):
+    # Read-only NaryTreeNode-style view of one node of a FlatTree
+    __slots__ = ('__tree', '__index')
+
+    def __init__(self, tree, index):
+        self.__tree = tree
+        self.__index = index
+
+    def get_index(self):
+        return self.__index
+
+    def get_value(self):
+        # NumPy scalars come back as the matching Python values
+        value = self.__tree.values[self.__index]
+        return value.item() if isinstance(value, np.generic) else value
+
+    def get_child(self, value):
+        return FlatTreeNode(self.__tree, self.__tree.get_child(self.__index, value))
+
+    def __iter__(self):
+        for child in self.__tree.get_children(self.__index).tolist():
+            yield FlatTreeNode(self.__tree, child)
+
+    def get_parent(self):
+        parent = int(self.__tree.parents[self.__index])
+        return FlatTreeNode(self.__tree, parent) if parent >= 0 else None
+
+    def subtree_size(self):
+        return self.__tree.subtree_size(self.__index)
+
+    def is_ancestor_of(self, other):
+        return self.__tree.is_ancestor(self.__index, other.get_index())
 
 class BTreeNode(object):
+    __slots__ = ('__val', '__left', '__right')
 
     def __init__(self, value, left=None, right=None):
         self.__val = value
@@ -53,6 +198,9 @@ class BTreeNode(object):
     def get_value(self):
         return self.__val
 
+    def set_value(self, value):
+        self.__val = value
+
     def add_left(self, node):
         self.__left = node
     
@@ -72,15 +220,7 @@ class BTreeNode(object):
             yield self.__right
 
     def level_order_traversal(self):
-        rep_string = "BTree: "
-        q = queue.SimpleQueue()
-        q.put(self)
-        while not q.empty():
-            node = q.get()
-            rep_string += str(node.get_value()) + ", "
-            for child in node:
-                q.put(child)
-        return rep_string
+        return "BTree: " + "".join(str(node.get_value()) + ", " for node in iter_level_order(self))
 
     def __repr__(self):
         return self.level_order_traversal()
@@ -88,12 +228,265 @@ class BTreeNode(object):
     def __str__(self):
         return self.level_order_traversal()
 
+class AVLNode(BTreeNode):
+    # BTreeNode plus the key it is ordered by, and its height and subtree size
+    __slots__ = ('__key', '__height', '__size')
+
+    def __init__(self, key, value, left=None, right=None):
+        super().__init__(value, left, right)
+        self.__key = key
+        self.update()
+
+    def get_key(self):
+        return self.__key
+
+    def get_height(self):
+        return self.__height
+
+    def get_size(self):
+        return self.__size
+
+    def update(self):
+        # Recomputes height and size from the children and returns the balance factor
+        left, right = self.get_left(), self.get_right()
+        left_height = left.__height if left is not None else 0
+        right_height = right.__height if right is not None else 0
+        self.__height = 1 + (left_height if left_height > right_height else right_height)
+        self.__size = 1 + (left.__size if left is not None else 0) + (right.__size if right is not None else 0)
+        return left_height - right_height
+
+def _height(node):
+    return node.get_height() if node is not None else 0
+
+def _size(node):
+    return node.get_size() if node is not None else 0
+
+def _rotate_left(node):
+    pivot = node.get_right()
+    node.add_right(pivot.get_left())
+    node.update()
+    pivot.add_left(node)
+    pivot.update()
+    return pivot
+
+def _rotate_right(node):
+    pivot = node.get_left()
+    node.add_left(pivot.get_right())
+    node.update()
+    pivot.add_right(node)
+    pivot.update()
+    return pivot
+
+def _rebalance(node):
+    """Updates node after one of its subtrees changed height by at most one and
+    returns the root of the subtree, rotated back within the AVL balance."""
+    balance = node.update()
+    if balance > 1:
+        if _height(node.get_left().get_left()) < _height(node.get_left().get_right()):
+            node.add_left(_rotate_left(node.get_left()))
+        return _rotate_right(node)
+    if balance < -1:
+        if _height(node.get_right().get_right()) < _height(node.get_right().get_left()):
+            node.add_right(_rotate_right(node.get_right()))
+        return _rotate_left(node)
+    return node
+
+def _pop_min(node):
+    # Returns the subtree without its smallest node, and that node
+    if node.get_left() is None:
+        return node.get_right(), node
+    left, smallest = _pop_min(node.get_left())
+    node.add_left(left)
+    return _rebalance(node), smallest
+
+class AVLMap(object):
+    """Ordered map on an AVL tree of AVLNode.
+
+    Insert, delete and lookups are O(log n). Subtree sizes in the nodes
+    give rank and select in O(log n) as well, and from_sorted builds a
+    balanced tree from sorted items in O(n).
+    """
+
+    def __init__(self, items=None):
+        self.__root = None
+        for key, value in items or ():
+            self.insert(key, value)
+
+    @classmethod
+    def from_sorted(cls, items):
+        """Builds the map from (key, value) pairs in strictly increasing key order."""
+        items = list(items)
+        for i in range(1, len(items)):
+            if not items[i - 1][0] < items[i][0]:
+                raise ValueError('Keys are not strictly increasing at: ' + str(items[i][0]))
+
+        def build(lo, hi):
+            if lo >= hi:
+                return None
+            mid = (lo + hi) // 2
+            key, value = items[mid]
+            return AVLNode(key, value, build(lo, mid), build(mid + 1, hi))
+
+        tree = cls()
+        tree.__root = build(0, len(items))
+        return tree
+
+    def get_root(self):
+        return self.__root
+
+    def __len__(self):
+        return _size(self.__root)
+
+    def insert(self, key, value=None):
+        self.__root = self.__insert(self.__root, key, value)
+
+    def __setitem__(self, key, value):
+        self.insert(key, value)
+
+    def __insert(self, node, key, value):
+        if node is None:
+            return AVLNode(key, value)
+        if key < node.get_key():
+            node.add_left(self.__insert(node.get_left(), key, value))
+        elif node.get_key() < key:
+            node.add_right(self.__insert(node.get_right(), key, value))
+        else:
+            node.set_value(value)
+            return node
+        return _rebalance(node)
+
+    def delete(self, key):
+        self.__root = self.__delete(self.__root, key)
+
+    def __delitem__(self, key):
+        self.delete(key)
+
+    def __delete(self, node, key):
+        if node is None:
+            raise KeyError('No element with key: ' + str(key))
+        if key < node.get_key():
+            node.add_left(self.__delete(node.get_left(), key))
+        elif node.get_key() < key:
+            node.add_right(self.__delete(node.get_right(), key))
+        else:
+            left, right = node.get_left(), node.get_right()
+            if left is None or right is None:
+                return left if right is None else right
+            # Replace the node by its successor
+            right, node = _pop_min(right)
+            node.add_left(left)
+            node.add_right(right)
+        return _rebalance(node)
+
+    def __find(self, key):
+        node = self.__root
+        while node is not None:
+            if key < node.get_key():
+                node = node.get_left()
+            elif node.get_key() < key:
+                node = node.get_right()
+            else:
+                return node
+        return None
+
+    def get(self, key, default=None):
+        node = self.__find(key)
+        return node.get_value() if node is not None else default
+
+    def __getitem__(self, key):
+        node = self.__find(key)
+        if node is None:
+            raise KeyError('No element with key: ' + str(key))
+        return node.get_value()
+
+    def __contains__(self, key):
+        return self.__find(key) is not None
+
+    def floor(self, key):
+        """Largest key <= key, or None."""
+        node, found = self.__root, None
+        while node is not None:
+            if key < node.get_key():
+                node = node.get_left()
+            else:
+                found = node.get_key()
+                node = node.get_right()
+        return found
+
+    def ceiling(self, key):
+        """Smallest key >= key, or None."""
+        node, found = self.__root, None
+        while node is not None:
+            if node.get_key() < key:
+                node = node.get_right()
+            else:
+                found = node.get_key()
+                node = node.get_left()
+        return found
+
+    def rank(self, key):
+        """Number of keys < key."""
+        node, rank = self.__root, 0
+        while node is not None:
+            if node.get_key() < key:
+                rank += _size(node.get_left()) + 1
+                node = node.get_right()
+            else:
+                node = node.get_left()
+        return rank
+
+    def select(self, i):
+        """The i-th smallest key, counting from 0."""
+        if not 0 <= i < len(self):
+            raise IndexError('Rank out of range: ' + str(i))
+        node = self.__root
+        while True:
+            left = _size(node.get_left())
+            if i < left:
+                node = node.get_left()
+            elif i > left:
+                i -= left + 1
+                node = node.get_right()
+            else:
+                return node.get_key()
+
+    def items(self, lo=None, hi=None):
+        """Yields (key, value) pairs in key order, for lo <= key < hi when given."""
+        stack = []
+        node = self.__root
+        while stack or node is not None:
+            while node is not None:
+                # Left subtrees that lie below lo are skipped entirely
+                if lo is not None and node.get_key() < lo:
+                    node = node.get_right()
+                else:
+                    stack.append(node)
+                    node = node.get_left()
+            if not stack:
+                return
+            node = stack.pop()
+            if hi is not None and not node.get_key() < hi:
+                return
+            yield node.get_key(), node.get_value()
+            node = node.get_right()
+
+    def keys(self, lo=None, hi=None):
+        for key, _ in self.items(lo, hi):
+            yield key
+
+    def __iter__(self):
+        return self.keys()
+
 class Trie(object):
+    # A key is any word added with add_word, whatever its value (None included)
 
     def __init__(self, root=None, words=None):
         if not root:
             root = TrieNode()
         self.__root = root
+        # Whether nodes cache their subtree's max value; top_k builds the cache
+        # on first use, so tries whose values do not order never compare them
+        self.__scored = False
         if not words:
             words = []
         for word in words:
@@ -101,120 +494,413 @@ class Trie(object):
 
     def add_word(self, word, value=None):
         node = self.__root
+        path = [node]
         for char in word:
             if not node.has_child(char):
                 node.add_child(char)
             node = node.get_child(char)
+            path.append(node)
+        old = node.get_value()
         node.set_value(value)
+        node.set_terminal(True)
+        if not self.__scored:
+            return
+        if value is None or (old is not None and value < old):
+            self.__update_max(path)
+            return
+        # A value that only grew can just raise the maxes above it
+        for node in reversed(path):
+            if node.get_max() is not None and node.get_max() >= value:
+                break
+            node.raise_max(value)
+
+    def __update_max(self, path):
+        # Bottom up; once a node's max is unchanged, so are its ancestors'
+        for node in reversed(path):
+            if not node.update_max():
+                break
+
+    def __path(self, key):
+        path = [self.__root]
+        for char in key:
+            node = path[-1].get_child(char)
+            if node is None:
+                break
+            path.append(node)
+        return path
+
+    def __find(self, key):
+        path = self.__path(key)
+        if len(path) <= len(key):
+            return None
+        return path[-1]
 
     def get_root(self):
         return self.__root
 
     def get_value(self, key):
-        node = self.__root
-        for char in key:
-            if node.has_child(char):
+        node = self.__find(key)
+        if node is None:
+            return None
+        return node.get_value()
+
+    def get_many(self, keys):
+        """Values of keys (None for missing ones), in the order given. Queries
+        are answered in sorted order, so each walk starts from the nodes it
+        shares with the previous key instead of from the root."""
+        keys = list(keys)
+        values = [None] * len(keys)
+        # path holds the nodes of previous[:len(path) - 1]
+        path = [self.__root]
+        previous = ''
+        for i in sorted(range(len(keys)), key=keys.__getitem__):
+            key = keys[i]
+            common = 0
+            limit = min(len(key), len(path) - 1)
+            while common < limit and key[common] == previous[common]:
+                common += 1
+            del path[common + 1:]
+            node = path[-1]
+            for char in key[common:]:
                 node = node.get_child(char)
+                if node is None:
+                    break
+                path.append(node)
             else:
-                return None
-        return node.get_value()
-    
+                values[i] = node.get_value()
+            previous = key
+        return values
+
+    def items_with_prefix(self, prefix=''):
+        """Lazily yields the (key, value) pairs of keys starting with prefix,
+        in sorted order."""
+        node = self.__find(prefix)
+        if node is None:
+            return
+        stack = [(prefix, node)]
+        while stack:
+            key, node = stack.pop()
+            if node.is_terminal():
+                yield key, node.get_value()
+            for child in reversed(node.get_children()):
+                stack.append((key + child.get_char(), child))
+
+    def keys_with_prefix(self, prefix=''):
+        for key, _ in self.items_with_prefix(prefix):
+            yield key
+
+    def longest_prefix_of(self, text):
+        """Longest key that text starts with, or None."""
+        node = self.__root
+        longest = '' if node.is_terminal() else None
+        for i, char in enumerate(text):
+            node = node.get_child(char)
+            if node is None:
+                break
+            if node.is_terminal():
+                longest = text[:i + 1]
+        return longest
+
+    def top_k(self, prefix, k):
+        """The k (key, value) pairs with the largest (numeric) values among keys
+        starting with prefix, largest first; keys with value None are left out.
+        Best-first search on the max value cached in each node, so only the
+        branches that hold results are opened."""
+        if not self.__scored:
+            for node in iter_post_order(self.__root):
+                node.update_max()
+            self.__scored = True
+        node = self.__find(prefix)
+        if node is None or node.get_max() is None:
+            return []
+        # Entries are (-priority, tiebreak, key, node); node is None for a finished key
+        heap = [(-node.get_max(), 0, prefix, node)]
+        count = 1
+        results = []
+        while heap and len(results) < k:
+            priority, _, key, node = heapq.heappop(heap)
+            if node is None:
+                results.append((key, -priority))
+                continue
+            if node.get_value() is not None:
+                heapq.heappush(heap, (-node.get_value(), count, key, None))
+                count += 1
+            for child in node:
+                if child.get_max() is not None:
+                    heapq.heappush(heap, (-child.get_max(), count, key + child.get_char(), child))
+                    count += 1
+        return results
+
     def delete(self, key):
-        return self.__delete(self.__root, key, 0)
+        result = self.__delete(self.__root, key, 0)
+        if self.__scored:
+            self.__update_max(self.__path(key))
+        return result
 
     def __delete(self, node, key, d):
+        # Returns whether node can be pruned from its parent
         if d == len(key):
             node.set_value(None)
+            node.set_terminal(False)
         else:
             c = key[d]
             if node.has_child(c) and self.__delete(node.get_child(c), key, d+1):
                 node.delete_child(c)
-            return node.get_value() is None and not node.has_children()
+        return not node.is_terminal() and not node.has_children()
+
+    def freeze(self):
+        return FrozenTrie(self.__root)
+
+    @classmethod
+    def from_items(cls, items):
+        """Bulk loads words or (word, value) pairs. Sorting them first means each
+        new edge lands at the end of its node's edges."""
+        trie = cls()
+        for item in sorted(items):
+            if isinstance(item, str):
+                trie.add_word(item)
+            else:
+                trie.add_word(*item)
+        return trie
 
 class TrieNode(object):
+    # Children are kept packed: edges is a sorted str of their characters and
+    # children the nodes in the same order, so leaves share the empty str and
+    # tuple instead of each holding 26 slots, and any character can be an edge
+    __slots__ = ('__val', '__char', '__edges', '__children', '__terminal', '__max')
 
-    def __init__(self, value=None, char=None, children=None):
+    def __init__(self, value=None, char=None, children=None, terminal=None):
         self.__val = value
         self.__char = char
-        if not children:
-            children = [None]*26
-        self.__children = children
+        self.__edges = ''
+        self.__children = ()
+        for child in children or ():
+            self.__insert(child)
+        # Whether a word ends here; by default, whether the node was given a value
+        self.__terminal = value is not None if terminal is None else terminal
+        self.__max = None
 
     def get_char(self):
         return self.__char
 
     def get_children(self):
-        return self.__children
+        return list(self.__children)
+
+    def get_edges(self):
+        return self.__edges
 
     def has_children(self):
-        return len(list([child for child in self.__children if child])) > 0
+        return bool(self.__edges)
 
     def set_value(self, value):
         self.__val = value
     
     def get_value(self):
         return self.__val
-    
-    def __get_index(self, char):
-        return ord(char) - 96 - 1
+
+    def is_terminal(self):
+        return self.__terminal
+
+    def set_terminal(self, terminal):
+        self.__terminal = terminal
+
+    def get_max(self):
+        # Largest value in this subtree, kept up to date by Trie once top_k is used
+        return self.__max
+
+    def raise_max(self, value):
+        self.__max = value
+
+    def update_max(self):
+        """Recomputes the max from the value and the children's maxes and
+        returns whether it changed."""
+        values = [child.__max for child in self.__children if child.__max is not None]
+        if self.__val is not None:
+            values.append(self.__val)
+        new_max = max(values) if values else None
+        changed = new_max != self.__max
+        self.__max = new_max
+        return changed
 
     def has_child(self, char):
-        index = self.__get_index(char)
-        return bool(self.__children[index])
+        return self.__edges.find(char) >= 0
 
     def get_child(self, char):
-        index = self.__get_index(char)
+        index = self.__edges.find(char)
+        if index < 0:
+            return None
         return self.__children[index]
 
     def add_child(self, char):
-        index = self.__get_index(char)
-        self.__children[index] = TrieNode(char=char)
+        if not self.has_child(char):
+            self.__insert(TrieNode(char=char))
+
+    def __insert(self, child):
+        char = child.get_char()
+        index = bisect_left(self.__edges, char)
+        self.__edges = self.__edges[:index] + char + self.__edges[index:]
+        if not self.__children:
+            self.__children = []
+        self.__children.insert(index, child)
 
     def delete_child(self, char):
-        index = self.__get_index(char)
+        index = self.__edges.find(char)
+        if index < 0:
+            return
+        self.__edges = self.__edges[:index] + self.__edges[index + 1:]
         del self.__children[index]
+        if not self.__children:
+            self.__children = ()
 
     def __iter__(self):
-        for child in self.__children:
-            if child:
-                yield child
+        return iter(self.__children)
+
+class FrozenTrie(object):
+    """Read-only Trie packed into flat arrays.
+
+    Nodes are numbered breadth first from the root (node 0), which numbers
+    them in the same order as the edges leading to them: edge e leads to
+    node e + 1. The edges of node i are labels[first_edge[i]:first_edge[i + 1]],
+    sorted, and values[i] is the value of node i.
+    """
+
+    def __init__(self, root):
+        labels = []
+        self.first_edge = array('q', [0])
+        self.values = []
+        q = deque([root])
+        edges = 0
+        while q:
+            node = q.popleft()
+            self.values.append(node.get_value())
+            labels.append(node.get_edges())
+            edges += len(node.get_edges())
+            q.extend(node)
+            self.first_edge.append(edges)
+        self.labels = ''.join(labels)
+
+    def __find(self, key):
+        first_edge, labels = self.first_edge, self.labels
+        node = 0
+        for char in key:
+            node = labels.find(char, first_edge[node], first_edge[node + 1]) + 1
+            if not node:
+                return None
+        return node
 
+    def get_value(self, key):
+        node = self.__find(key)
+        if node is None:
+            return None
+        return self.values[node]
 
+    def __len__(self):
+        # Number of nodes, the root included
+        return len(self.values)
 
-def print_level_order_traversal(root, method):
-    if not root:
+
+
+# The traversals below are generators over nodes that keep their own stack
+# or queue, so they do not hit the recursion limit on deep trees. Pre-order,
+# post-order and level order work on any node that iterates over its
+# children (NaryTreeNode, BTreeNode, TrieNode); in-order needs a BTreeNode.
+
+def iter_level_order(root):
+    if root is None:
         return
-    q = queue.SimpleQueue()
-    q.put(root)
-    while not q.empty():
-        node = q.get()
+    q = deque([root])
+    while q:
+        node = q.popleft()
+        yield node
+        q.extend(node)
+
+def iter_levels(root):
+    # One list of nodes per level, top down
+    level = [root] if root is not None else []
+    while level:
+        yield level
+        level = [child for node in level for child in node]
+
+def iter_pre_order(root):
+    # Root, children left to right
+    stack = [root] if root is not None else []
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(list(node)))
+
+def iter_post_order(root):
+    # Children left to right, Root
+    stack = [(root, False)] if root is not None else []
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            yield node
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(list(node)))
+
+def iter_in_order(root, morris=False):
+    # Left, Root, Right
+    if morris:
+        yield from _morris_in_order(root)
+        return
+    stack = []
+    node = root
+    while stack or node is not None:
+        while node is not None:
+            stack.append(node)
+            node = node.get_left()
+        node = stack.pop()
+        yield node
+        node = node.get_right()
+
+def _morris_in_order(root):
+    """In-order traversal in O(1) extra memory: the rightmost node of each left
+    subtree is temporarily linked back to its successor to find the way up.
+    If the generator is abandoned early it still walks the rest of the tree,
+    without yielding, to remove those links."""
+    steps = _morris_steps(root)
+    try:
+        for node in steps:
+            yield node
+    finally:
+        for _ in steps:
+            pass
+
+def _morris_steps(node):
+    while node is not None:
+        left = node.get_left()
+        if left is None:
+            yield node
+            node = node.get_right()
+            continue
+        predecessor = left
+        while predecessor.get_right() is not None and predecessor.get_right() is not node:
+            predecessor = predecessor.get_right()
+        if predecessor.get_right() is None:
+            predecessor.add_right(node)
+            node = left
+        else:
+            predecessor.remove_right()
+            yield node
+            node = node.get_right()
+
+def print_level_order_traversal(root, method):
+    for node in iter_level_order(root):
         print('Node: ', method(node))
-        for child in node:
-            q.put(child)
 
 def in_order(node):
-    # Left, Root, Right
-    if node.get_left():
-        in_order(node.get_left())
-    print('Node: ', node.get_value())
-    if node.get_right():
-        in_order(node.get_right())
+    for n in iter_in_order(node):
+        print('Node: ', n.get_value())
 
 def pre_order(node):
-    # Root, Left, Right
-    print('Node: ', node.get_value())
-    if node.get_left():
-        pre_order(node.get_left())
-    if node.get_right():
-        pre_order(node.get_right())
+    for n in iter_pre_order(node):
+        print('Node: ', n.get_value())
 
 def post_order(node):
-    # Left, Right, Root
-    if node.get_left():
-        post_order(node.get_left())
-    if node.get_right():
-        post_order(node.get_right())
-    print('Node: ', node.get_value())
+    for n in iter_post_order(node):
+        print('Node: ', n.get_value())
 
 
 
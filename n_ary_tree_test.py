@@ -0,0 +1,385 @@
+import bisect
+import random
+import unittest
+from n_ary_tree import *
+
+
+def random_word(rng, alphabet, longest):
+    return ''.join(rng.choice(alphabet) for _ in range(rng.randrange(longest + 1)))
+
+def count_nodes(root):
+    return sum(1 for _ in iter_pre_order(root))
+
+
+class TrieTestCase(unittest.TestCase):
+
+    def test_trie_node_edges(self):
+        node = TrieNode()
+        self.assertFalse(node.has_children())
+        for char in 'zaé1Z a':
+            node.add_child(char)
+        # Any character is an edge, kept sorted and without duplicates
+        self.assertEqual(node.get_edges(), ''.join(sorted(set('zaé1Z '))))
+        self.assertEqual([child.get_char() for child in node], sorted(set('zaé1Z ')))
+        self.assertEqual(node.get_child('é').get_char(), 'é')
+        self.assertIsNone(node.get_child('q'))
+        # Deleting one child leaves the others reachable by their own characters
+        node.delete_child('Z')
+        node.delete_child('q')
+        self.assertFalse(node.has_child('Z'))
+        for char in 'zaé1 ':
+            self.assertEqual(node.get_child(char).get_char(), char)
+        for char in 'zaé1 ':
+            node.delete_child(char)
+        self.assertFalse(node.has_children())
+        self.assertEqual(node.get_children(), [])
+
+    def test_random_operations(self):
+        rng = random.Random(20)
+        trie, expected = Trie(), {}
+        for step in range(5000):
+            word = random_word(rng, 'abé Z', 5)
+            if rng.random() < 0.7:
+                trie.add_word(word, step)
+                expected[word] = step
+            else:
+                trie.delete(word)
+                expected.pop(word, None)
+        for word in list(expected) + ['zzzzzz', 'abéZ ab']:
+            self.assertEqual(trie.get_value(word), expected.get(word))
+        # Deleting every key prunes the trie back to its root
+        for word in list(expected):
+            trie.delete(word)
+        self.assertEqual(count_nodes(trie.get_root()), 1)
+
+    def test_delete_prunes_branches(self):
+        trie = Trie()
+        trie.add_word('pick', 1)
+        trie.add_word('picked', 2)
+        trie.delete('picked')
+        self.assertEqual(count_nodes(trie.get_root()), 5)
+        self.assertEqual(trie.get_value('pick'), 1)
+        trie.delete('pick')
+        self.assertEqual(count_nodes(trie.get_root()), 1)
+
+    def test_from_items(self):
+        items = [('peter', 1), ('piper', 2), ('picked', 3), ('pi', 4)]
+        trie = Trie.from_items(items)
+        self.assertEqual(trie.get_many([word for word, _ in items]), [1, 2, 3, 4])
+        trie = Trie.from_items(['b', 'a'])
+        self.assertEqual(trie.get_root().get_edges(), 'ab')
+
+    def test_freeze(self):
+        rng = random.Random(21)
+        trie, expected = Trie(), {}
+        for step in range(2000):
+            word = random_word(rng, 'abcdé', 6)
+            trie.add_word(word, step)
+            expected[word] = step
+        frozen = trie.freeze()
+        self.assertEqual(len(frozen), count_nodes(trie.get_root()))
+        for _ in range(2000):
+            word = random_word(rng, 'abcdéf', 7)
+            self.assertEqual(frozen.get_value(word), expected.get(word))
+        self.assertIsNone(Trie().freeze().get_value('a'))
+
+
+class TrieQueryTestCase(unittest.TestCase):
+
+    def test_queries_match_dict(self):
+        rng = random.Random(22)
+        trie, expected = Trie(), {}
+        for step in range(5000):
+            word = random_word(rng, 'abcd', 5)
+            r = rng.random()
+            if r < 0.5:
+                value = rng.randrange(1000)
+                trie.add_word(word, value)
+                expected[word] = value
+            elif r < 0.6:
+                # A key with value None is still a key, but is left out of top_k
+                trie.add_word(word)
+                expected[word] = None
+            elif r < 0.8:
+                trie.delete(word)
+                expected.pop(word, None)
+            if step % 100 == 0:
+                prefix = random_word(rng, 'abcd', 2)
+                items = sorted((k, v) for k, v in expected.items() if k.startswith(prefix))
+                self.assertEqual(list(trie.items_with_prefix(prefix)), items)
+                self.assertEqual(list(trie.keys_with_prefix(prefix)), [k for k, _ in items])
+                # The max cache is built on the first top_k and kept up to date after it
+                top = sorted((v for _, v in items if v is not None), reverse=True)[:5]
+                self.assertEqual([v for _, v in trie.top_k(prefix, 5)], top)
+                self.assertTrue(all(expected[k] == v for k, v in trie.top_k(prefix, 5)))
+                text = random_word(rng, 'abcd', 8)
+                prefixes = [k for k in expected if text.startswith(k)]
+                self.assertEqual(trie.longest_prefix_of(text), max(prefixes, key=len) if prefixes else None)
+                queries = [random_word(rng, 'abcde', 5) for _ in range(50)]
+                self.assertEqual(trie.get_many(queries), [expected.get(q) for q in queries])
+
+    def test_words_without_values_are_keys(self):
+        trie = Trie(words=['Peter', 'piper', 'picked'])
+        self.assertEqual(list(trie.keys_with_prefix('p')), ['peter', 'picked', 'piper'])
+        self.assertEqual(trie.longest_prefix_of('pipers'), 'piper')
+        self.assertIsNone(trie.longest_prefix_of('pip'))
+        self.assertEqual(trie.top_k('p', 3), [])
+        trie.delete('piper')
+        self.assertEqual(list(trie.keys_with_prefix('pi')), ['picked'])
+
+    def test_values_need_not_be_ordered(self):
+        trie = Trie()
+        trie.add_word('a', {'x': 1})
+        trie.add_word('b', {'y': 2})
+        trie.add_word('a', [1])
+        trie.delete('b')
+        self.assertEqual(list(trie.items_with_prefix()), [('a', [1])])
+
+    def test_top_k(self):
+        trie = Trie.from_items([('pick', 10), ('picked', 15), ('piper', 5), ('peter', 1), ('pi', 20)])
+        self.assertEqual(trie.top_k('pi', 3), [('pi', 20), ('picked', 15), ('pick', 10)])
+        self.assertEqual(trie.top_k('pe', 3), [('peter', 1)])
+        self.assertEqual(trie.top_k('x', 3), [])
+        trie.add_word('pipe', 30)
+        trie.delete('pi')
+        trie.add_word('picked', 2)
+        self.assertEqual(trie.top_k('p', 3), [('pipe', 30), ('pick', 10), ('piper', 5)])
+
+
+def random_btree(rng, n):
+    # Random shape with nodes valued 0..n-1 in in-order
+    if n == 0:
+        return None
+    left = rng.randrange(n)
+    root = BTreeNode(left)
+    root.add_left(random_btree(rng, left))
+    right = random_btree(rng, n - 1 - left)
+    for node in iter_pre_order(right):
+        node.set_value(node.get_value() + left + 1)
+    root.add_right(right)
+    return root
+
+def recursive_orders(node):
+    # (in-order, pre-order, post-order) values, by plain recursion
+    if node is None:
+        return [], [], []
+    left, right = recursive_orders(node.get_left()), recursive_orders(node.get_right())
+    value = [node.get_value()]
+    return left[0] + value + right[0], value + left[1] + right[1], left[2] + right[2] + value
+
+def values(nodes):
+    return [node.get_value() for node in nodes]
+
+
+class TraversalTestCase(unittest.TestCase):
+
+    def test_btree_orders(self):
+        rng = random.Random(23)
+        for n in list(range(8)) + [rng.randrange(100) for _ in range(30)]:
+            root = random_btree(rng, n)
+            in_order, pre_order, post_order = recursive_orders(root)
+            self.assertEqual(in_order, list(range(n)))
+            self.assertEqual(values(iter_in_order(root)), in_order)
+            self.assertEqual(values(iter_in_order(root, morris=True)), in_order)
+            self.assertEqual(values(iter_pre_order(root)), pre_order)
+            self.assertEqual(values(iter_post_order(root)), post_order)
+            # Morris threading is undone, including when the walk is abandoned
+            walk = iter_in_order(root, morris=True)
+            next(walk, None)
+            walk.close()
+            self.assertEqual(recursive_orders(root), (in_order, pre_order, post_order))
+
+    def test_levels(self):
+        root = create_new_nary_tree()
+        self.assertEqual([values(level) for level in iter_levels(root)], [[1], [2, 3, 4], [5, 6, 7, 8, 9, 10, 11]])
+        self.assertEqual(values(iter_level_order(root)), list(range(1, 12)))
+        self.assertEqual(values(iter_pre_order(root)), [1, 2, 5, 6, 7, 3, 8, 4, 9, 10, 11])
+        self.assertEqual(values(iter_post_order(root)), [5, 6, 7, 2, 8, 3, 9, 10, 11, 4, 1])
+        self.assertEqual(str(create_new_btree()), 'BTree: 1, 2, 3, 4, 5, ')
+        self.assertEqual(list(iter_levels(None)), [])
+        self.assertEqual(list(iter_in_order(None, morris=True)), [])
+
+    def test_deep_trees(self):
+        n = 100000
+        root_left, root_right = BTreeNode(0), BTreeNode(0)
+        left_chain, right_chain = root_left, root_right
+        for i in range(1, n):
+            left_chain.add_left(BTreeNode(i))
+            left_chain = left_chain.get_left()
+            right_chain.add_right(BTreeNode(i))
+            right_chain = right_chain.get_right()
+        for root in (root_left, root_right):
+            self.assertEqual(sum(1 for _ in iter_in_order(root)), n)
+            self.assertEqual(sum(1 for _ in iter_in_order(root, morris=True)), n)
+            self.assertEqual(sum(1 for _ in iter_post_order(root)), n)
+            self.assertEqual(sum(1 for _ in iter_levels(root)), n)
+
+
+class FlatTreeTestCase(unittest.TestCase):
+
+    def random_parents(self, rng, n):
+        order = list(range(n))
+        rng.shuffle(order)
+        parents = [-1] * n
+        for i in range(1, n):
+            parents[order[i]] = order[rng.randrange(i)]
+        return parents
+
+    def test_subtree_queries_match_brute_force(self):
+        rng = random.Random(24)
+        for n in [1, 2, 5] + [rng.randrange(1, 200) for _ in range(20)]:
+            parents = self.random_parents(rng, n)
+            tree = FlatTree.from_parents(parents)
+
+            def ancestors(node):
+                while node != -1:
+                    yield node
+                    node = parents[node]
+
+            for node in range(n):
+                self.assertEqual(list(tree.get_children(node)), [i for i in range(n) if parents[i] == node])
+                self.assertEqual(tree.subtree_size(node), sum(node in ancestors(other) for other in range(n)))
+            for _ in range(200):
+                a, b = rng.randrange(n), rng.randrange(n)
+                self.assertEqual(bool(tree.is_ancestor(a, b)), a in ancestors(b))
+
+    def test_from_nary(self):
+        nary = create_new_nary_tree()
+        root = FlatTree.from_nary(nary).get_root()
+        self.assertEqual(values(iter_pre_order(root)), values(iter_pre_order(nary)))
+        self.assertEqual(root.subtree_size(), 11)
+        self.assertEqual(root.get_child(2).subtree_size(), 4)
+        self.assertTrue(root.get_child(2).is_ancestor_of(root.get_child(2).get_child(6)))
+        self.assertFalse(root.get_child(3).is_ancestor_of(root.get_child(2)))
+        self.assertEqual(root.get_child(4).get_child(10).get_parent().get_value(), 4)
+        self.assertIsNone(root.get_parent())
+        # Values come back as Python values, like NaryTreeNode's
+        self.assertIs(type(root.get_value()), int)
+        with self.assertRaises(KeyError):
+            root.get_child(99)
+
+    def test_index_agrees_with_scan(self):
+        rng = random.Random(25)
+        parents = self.random_parents(rng, 300)
+        # Few distinct values, so siblings often share one
+        tree = FlatTree.from_parents(parents, [rng.randrange(4) for _ in range(300)])
+        queries = [(node, value) for node in range(300) for value in range(5)]
+
+        def lookup(node, value):
+            try:
+                return tree.get_child(node, value)
+            except KeyError:
+                return None
+
+        scanned = [lookup(node, value) for node, value in queries]
+        tree.build_index()
+        self.assertEqual([lookup(node, value) for node, value in queries], scanned)
+        self.assertTrue(any(found is not None for found in scanned))
+
+    def test_bad_parents(self):
+        for parents in ([0, -1, 5], [-1, -1], [1, 0], [-1, 2, 1]):
+            with self.assertRaises(ValueError):
+                FlatTree.from_parents(parents)
+        with self.assertRaises(ValueError):
+            FlatTree.from_parents([-1, 0], values=[1])
+
+    def test_nary_tree_node(self):
+        root = create_new_nary_tree()
+        with self.assertRaises(KeyError):
+            root.get_child(99)
+        root.add_child(NaryTreeNode(3))
+        root.remove_child(3)
+        self.assertEqual(values(root), [2, 4, 3])
+        root.remove_child(3)
+        with self.assertRaises(KeyError):
+            root.remove_child(3)
+        self.assertEqual(values(root), [2, 4])
+
+
+class AVLMapTestCase(unittest.TestCase):
+
+    def check_balanced(self, node):
+        # Returns the height, checking the AVL balance and the cached height and size
+        if node is None:
+            return 0
+        left, right = self.check_balanced(node.get_left()), self.check_balanced(node.get_right())
+        self.assertLessEqual(abs(left - right), 1)
+        self.assertEqual(node.get_height(), 1 + max(left, right))
+        sizes = [child.get_size() for child in node]
+        self.assertEqual(node.get_size(), 1 + sum(sizes))
+        return 1 + max(left, right)
+
+    def check_queries(self, tree, expected, rng):
+        keys = sorted(expected)
+        self.assertEqual(len(tree), len(keys))
+        self.assertEqual(list(tree), keys)
+        self.assertEqual(list(tree.items()), [(key, expected[key]) for key in keys])
+        for _ in range(50):
+            query = rng.randrange(-5, 2005)
+            below = bisect.bisect_left(keys, query)
+            upto = bisect.bisect_right(keys, query)
+            self.assertEqual(tree.rank(query), below)
+            self.assertEqual(tree.floor(query), keys[upto - 1] if upto else None)
+            self.assertEqual(tree.ceiling(query), keys[below] if below < len(keys) else None)
+            self.assertEqual(tree.get(query), expected.get(query))
+            lo, hi = sorted([rng.randrange(-5, 2005), rng.randrange(-5, 2005)])
+            self.assertEqual(list(tree.keys(lo, hi)), [key for key in keys if lo <= key < hi])
+            self.assertEqual(list(tree.keys(lo)), [key for key in keys if lo <= key])
+            self.assertEqual(list(tree.keys(hi=hi)), [key for key in keys if key < hi])
+        for i in range(len(keys)):
+            self.assertEqual(tree.select(i), keys[i])
+
+    def test_random_operations(self):
+        rng = random.Random(26)
+        tree, expected = AVLMap(), {}
+        for step in range(10000):
+            key = rng.randrange(2000)
+            if rng.random() < 0.6:
+                tree[key] = step
+                expected[key] = step
+            elif key in expected:
+                del tree[key]
+                del expected[key]
+            else:
+                with self.assertRaises(KeyError):
+                    tree.delete(key)
+            if step % 1000 == 0:
+                self.check_balanced(tree.get_root())
+                self.check_queries(tree, expected, rng)
+        self.check_balanced(tree.get_root())
+        self.check_queries(tree, expected, rng)
+
+    def test_sorted_inserts_stay_balanced(self):
+        tree = AVLMap((key, key) for key in range(4095))
+        self.assertEqual(self.check_balanced(tree.get_root()), 12)
+
+    def test_lookups(self):
+        tree = AVLMap([(3, 'c'), (1, 'a'), (2, 'b')])
+        self.assertEqual(tree[2], 'b')
+        self.assertIn(3, tree)
+        self.assertNotIn(4, tree)
+        with self.assertRaises(KeyError):
+            tree[4]
+        with self.assertRaises(IndexError):
+            tree.select(3)
+        with self.assertRaises(IndexError):
+            AVLMap().select(0)
+        self.assertIsNone(AVLMap().floor(1))
+        # AVL nodes are BTreeNodes, so the traversals work on them
+        self.assertEqual(values(iter_in_order(tree.get_root())), ['a', 'b', 'c'])
+
+    def test_from_sorted(self):
+        rng = random.Random(27)
+        for n in [0, 1, 2, 3, 100, 1000]:
+            expected = {key: -key for key in sorted(rng.sample(range(2000), n))}
+            tree = AVLMap.from_sorted(expected.items())
+            self.check_balanced(tree.get_root())
+            self.check_queries(tree, expected, rng)
+        with self.assertRaises(ValueError):
+            AVLMap.from_sorted([(1, 'a'), (1, 'b')])
+        with self.assertRaises(ValueError):
+            AVLMap.from_sorted([(2, 'a'), (1, 'b')])
+
+
+if __name__ == '__main__':
+    unittest.main()
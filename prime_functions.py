@@ -1,43 +1,278 @@
 import math
-import copy
-from collections import Counter
-from itertools import combinations
-import numpy as np
 import operator
+import os
+import functools
+import itertools
+from array import array
+from collections import Counter, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import heapq
+import numpy as np
 
 
+# Chunks handed out per worker, so one slow chunk does not leave the others idle
+PARALLEL_CHUNKS_PER_WORKER = 4
+
 """
-    Returns prime factors of a given non-negative number
+    Splits [lo, hi) into at most parts contiguous (lo, hi) ranges
 """
-def prime_factors(n, primes=[]):
-    copied_primes = copy.deepcopy(primes)
+def split_range(lo, hi, parts):
+    parts = max(1, min(parts, hi - lo))
+    bounds = [lo + (hi - lo) * i // parts for i in range(parts + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+"""
+    workers=None means one worker per CPU
+"""
+def worker_count(workers):
+    if workers is None:
+        return os.cpu_count() or 1
+    return max(1, workers)
+
+"""
+    Calls func(*args) for every args in chunks and folds the results
+    together, in chunk order, with reduce
+
+    With more than one worker the calls run on a process pool, so func
+    must be a module-level function. Since the fold order never changes,
+    the result is the same as the serial one
+"""
+def parallel_reduce(func, chunks, reduce, workers=1):
+    workers = worker_count(workers)
+    if workers == 1:
+        return functools.reduce(reduce, itertools.starmap(func, chunks))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return functools.reduce(reduce, pool.map(func, *zip(*chunks)))
+
+"""
+    Returns the first result of func(*args) that is not None, in chunk
+    order, or None if every chunk comes back empty. chunks may be endless
+
+    With more than one worker, up to two chunks per worker are in flight
+    at once. Results are taken in submission order, so a hit in a later
+    chunk never wins over an earlier one, and once the earliest hit is
+    known the chunks still queued are cancelled
+"""
+def parallel_first(func, chunks, workers=1):
+    workers = worker_count(workers)
+    chunks = iter(chunks)
+    if workers == 1:
+        for args in chunks:
+            result = func(*args)
+            if result is not None:
+                return result
+        return None
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = deque(pool.submit(func, *args) for args in itertools.islice(chunks, 2 * workers))
+        while pending:
+            result = pending.popleft().result()
+            if result is not None:
+                return result
+            args = next(chunks, None)
+            if args is not None:
+                pending.append(pool.submit(func, *args))
+        return None
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+# Numbers below this are factored by walking a cached smallest-prime-factor table
+SPF_TABLE_SIZE = 2**20
+
+# Witnesses that make Miller-Rabin deterministic for n < 3.3 * 10^24
+MILLER_RABIN_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37)
+
+_spf_table = None
+
+"""
+    Returns an array spf where spf[k] is the smallest prime factor of k
+    for all 2 <= k < n
+
+    Crosses off multiples of the primes in decreasing order, so the
+    last (smallest) prime to touch k is the one left in the table
+"""
+def smallest_prime_factor_table(n):
+    spf = np.arange(n, dtype=np.int32 if n <= 2**31 else np.int64)
+    for p in sieve_of_erastothenes(math.isqrt(max(n - 1, 0)) + 1)[::-1].tolist():
+        spf[p*p::p] = p
+    return spf
+
+def _cached_spf_table():
+    global _spf_table
+    if _spf_table is None:
+        # A plain array indexes to Python ints, which is much faster in the factoring loop
+        _spf_table = array('i', smallest_prime_factor_table(SPF_TABLE_SIZE).astype(np.int32).tobytes())
+    return _spf_table
+
+"""
+    Miller-Rabin primality test
+
+    Deterministic for n < 3.3 * 10^24, above that a composite
+    passing all of MILLER_RABIN_BASES is vanishingly unlikely
+"""
+def is_prime(n):
+    if n < 2:
+        return False
+    for p in MILLER_RABIN_BASES:
+        if n % p == 0:
+            return n == p
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    for a in MILLER_RABIN_BASES:
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+"""
+    Returns a non-trivial factor of the odd composite n
+
+    Pollard's rho with Brent's cycle detection, batching the gcd
+    over m steps and backtracking if the batch overshoots
+"""
+def pollard_brent(n, m=128):
+    if n % 2 == 0:
+        return 2
+    c = 1
+    while True:
+        y, r, q, g = 2, 1, 1, 1
+        while g == 1:
+            x = y
+            for _ in range(r):
+                y = (y * y + c) % n
+            k = 0
+            while k < r and g == 1:
+                ys = y
+                for _ in range(min(m, r - k)):
+                    y = (y * y + c) % n
+                    q = q * abs(x - y) % n
+                g = math.gcd(q, n)
+                k += m
+            r *= 2
+        if g == n:
+            g = 1
+            while g == 1:
+                ys = (ys * ys + c) % n
+                g = math.gcd(abs(x - ys), n)
+        if g != n:
+            return g
+        # The walk collapsed onto n itself, retry with another polynomial
+        c += 1
+
+"""
+    Returns the prime factorization of a non-negative integer n
+    as a sorted list of (prime, exponent) pairs:
+        factorize(360) = [(2, 3), (3, 2), (5, 1)]
+"""
+def factorize(n):
     if n < 0:
         raise ValueError('Negative values are not valid')
-    if n < 2:
-        return copied_primes
-    for i in range(2, math.floor(n/2) + 1):
-        if n % i == 0:
-            copied_primes.append(i)
-            return prime_factors(n/i, primes=copied_primes)
-    
-    copied_primes.append(n)
+    spf = _cached_spf_table()
+    factors = Counter()
+    if n >= len(spf):
+        # Cheap trial division takes care of the small primes before Pollard-rho
+        for p in MILLER_RABIN_BASES:
+            while n % p == 0:
+                factors[p] += 1
+                n //= p
+    stack = [n] if n > 1 else []
+    while stack:
+        m = stack.pop()
+        if m < len(spf):
+            while m > 1:
+                p = spf[m]
+                factors[p] += 1
+                m //= p
+        elif is_prime(m):
+            factors[m] += 1
+        else:
+            d = pollard_brent(m)
+            stack.append(d)
+            stack.append(m // d)
+    return sorted(factors.items())
+
+"""
+    Returns prime factors of a given non-negative number,
+    in increasing order and repeated by multiplicity
+"""
+def prime_factors(n, primes=[]):
+    copied_primes = list(primes)
+    for p, e in factorize(n):
+        copied_primes.extend([p] * e)
     return copied_primes
 
 """
-    Returns all divisors of a given number n
+    Yields the positive divisors of n, working from its (prime, exponent)
+    factorization so no divisor is ever produced twice
+
+    Unordered, the exponent vector is stepped like an odometer. Ordered, a heap
+    holds each divisor with the index of its largest prime and that prime's
+    exponent, and popping d only pushes d times that prime or a larger one
 """
-def all_divisors(n):
+def iter_divisors(n, ordered=False):
     if n == 0:
-        return set([])
-    if n < 0:
-        prime_divisors = prime_factors(-1 * n)
-        divisors = [-1, *prime_divisors]
-    else:
-        prime_divisors = prime_factors(n)
-        divisors = [1, *prime_divisors]
-    for i in range(1, len(prime_divisors)+1):
-        divisors = [*divisors, *list(map(np.prod, combinations(prime_divisors, i)))]
-    return set(divisors)
+        return
+    factors = factorize(abs(n))
+    if not ordered:
+        exponents = [0] * len(factors)
+        d = 1
+        while True:
+            yield d
+            for i, (p, e) in enumerate(factors):
+                if exponents[i] < e:
+                    exponents[i] += 1
+                    d *= p
+                    break
+                d //= p ** e
+                exponents[i] = 0
+            else:
+                return
+    heap = [(1, -1, 0)]
+    while heap:
+        d, i, e = heapq.heappop(heap)
+        yield d
+        if i >= 0 and e < factors[i][1]:
+            heapq.heappush(heap, (d * factors[i][0], i, e + 1))
+        for j in range(i + 1, len(factors)):
+            heapq.heappush(heap, (d * factors[j][0], j, 1))
+
+"""
+    Returns the number of positive divisors of n without listing them
+"""
+def divisor_count(n):
+    if n == 0:
+        return 0
+    count = 1
+    for _, e in factorize(abs(n)):
+        count *= e + 1
+    return count
+
+"""
+    Returns the sum of the positive divisors of n without listing them
+"""
+def divisor_sum(n):
+    if n == 0:
+        return 0
+    total = 1
+    for p, e in factorize(abs(n)):
+        total *= (p ** (e + 1) - 1) // (p - 1)
+    return total
+
+"""
+    Returns all positive divisors of a given number n
+    A negative n has the same divisors as -n
+"""
+def all_divisors(n):
+    return set(iter_divisors(n))
 
 """
     Generates the natural numbers:
@@ -63,18 +298,129 @@ def triangle_number_generator():
         yield triangle
         triangle += next(n)
 
+# Arithmetic functions of every k < n, as computed by divisor_function_sieve
+ArithmeticSieve = namedtuple('ArithmeticSieve', ['spf', 'sigma0', 'sigma1', 'phi', 'mobius'])
+
+"""
+    Computes, for all 0 <= k < n in one vectorized pass:
+        spf:    smallest prime factor
+        sigma0: number of divisors
+        sigma1: sum of divisors
+        phi:    Euler's totient
+        mobius: Mobius function
+    Every entry for k = 0 is 0
+
+    Primes below sqrt(n) update their multiples through strided slices,
+    which leaves at most one prime factor above sqrt(n) in each k to be
+    folded in with a single mask at the end
+"""
+def divisor_function_sieve(n):
+    n = max(n, 2)
+    spf = smallest_prime_factor_table(n)
+    index_type = spf.dtype
+    sigma0 = np.ones(n, dtype=np.int32)
+    sigma1 = np.ones(n, dtype=np.int64)
+    phi = np.ones(n, dtype=index_type)
+    mobius = np.ones(n, dtype=np.int8)
+    rest = np.arange(n, dtype=index_type)
+
+    for p in sieve_of_erastothenes(math.isqrt(n - 1) + 1).tolist():
+        # exponent[m - 1] is the exponent of p in the multiple k = p*m
+        exponent = np.ones((n - 1) // p, dtype=np.int8)
+        power = p
+        while power * p < n:
+            exponent[power - 1::power] += 1
+            power *= p
+        # Each function only depends on the exponent, so look its value up per exponent
+        powers = p ** np.arange(int(math.log(n, p)) + 2, dtype=np.int64)
+        sigma0[p::p] *= exponent + 1
+        sigma1[p::p] *= ((powers[1:] - 1) // (p - 1))[exponent]
+        phi[p::p] *= np.r_[1, powers[1:-1] - powers[:-2]].astype(index_type)[exponent]
+        mobius[p::p] *= np.where(exponent == 1, -1, 0).astype(np.int8)
+        rest[p::p] //= powers.astype(index_type)[exponent]
+
+    large = np.nonzero(rest > 1)[0]
+    q = rest[large]
+    sigma0[large] *= 2
+    sigma1[large] *= q.astype(np.int64) + 1
+    phi[large] *= q - 1
+    mobius[large] *= -1
+
+    for values in (spf, sigma0, sigma1, phi, mobius):
+        values[0] = 0
+    return ArithmeticSieve(spf, sigma0, sigma1, phi, mobius)
+
+# Number of triangle indices k each parallel triangle_divisors chunk covers
+TRIANGLE_CHUNK_SIZE = 2**16
+
+"""
+    Returns an int32 array with the number of divisors of every lo <= k < hi
+
+    Works on the window alone, stripping powers of each prime below
+    sqrt(hi) from its multiples, so lo can be arbitrarily far from 0
+"""
+def divisor_counts(lo, hi):
+    rest = np.arange(lo, hi, dtype=np.int64)
+    counts = np.ones(hi - lo, dtype=np.int32)
+    for p in sieve_of_erastothenes(math.isqrt(max(hi - 1, 0)) + 1).tolist():
+        first = max(-(-lo // p) * p, p)
+        if first >= hi:
+            continue
+        multiples = rest[first - lo::p]
+        exponent = np.zeros(len(multiples), dtype=np.int32)
+        divisible = np.arange(len(multiples))
+        while len(divisible):
+            multiples[divisible] //= p
+            exponent[divisible] += 1
+            divisible = divisible[multiples[divisible] % p == 0]
+        rest[first - lo::p] = multiples
+        counts[first - lo::p] *= exponent + 1
+    counts[rest > 1] *= 2
+    counts[rest == 0] = 0
+    return counts
+
 """
     Returns the first triangular number with greater-than n divisors
 
-    NOTE: Is currently too slow
+    T(k) = k(k+1)/2 splits into the coprime halves k/2 and k+1 (k even)
+    or k and (k+1)/2 (k odd), so its divisor count is the product of two
+    lookups into a divisor-count sieve. The sieve doubles until a hit is found
+
+    With workers > 1, fixed-size ranges of k are searched in parallel
+    and the earliest hit is returned
 """
-def triangle_divisors(n):
-    triangle = triangle_number_generator()
+def triangle_divisors(n, workers=1):
+    if worker_count(workers) > 1:
+        chunks = ((k, k + TRIANGLE_CHUNK_SIZE, n) for k in itertools.count(1, TRIANGLE_CHUNK_SIZE))
+        return parallel_first(_first_triangle_in, chunks, workers=workers)
+    limit = 1024
     while True:
-        t = next(triangle)
-        divisors = all_divisors(t)
-        if len(divisors) > n:
-            return t
+        sigma0 = divisor_function_sieve(limit + 1).sigma0.astype(np.int64)
+        k = np.arange(1, limit, dtype=np.int64)
+        even = k % 2 == 0
+        counts = sigma0[np.where(even, k // 2, k)] * sigma0[np.where(even, k + 1, (k + 1) // 2)]
+        hits = np.nonzero(counts > n)[0]
+        if len(hits):
+            k = int(k[hits[0]])
+            return k * (k + 1) // 2
+        limit *= 2
+
+"""
+    Returns the first triangular number T(k), lo <= k < hi, with
+    greater-than n divisors, or None
+"""
+def _first_triangle_in(lo, hi, n):
+    offset = lo // 2
+    sigma0 = divisor_counts(offset, hi + 1).astype(np.int64)
+    k = np.arange(lo, hi, dtype=np.int64)
+    even = k % 2 == 0
+    counts = sigma0[np.where(even, k // 2, k) - offset] * sigma0[np.where(even, k + 1, (k + 1) // 2) - offset]
+    hits = np.nonzero(counts > n)[0]
+    if len(hits):
+        k = int(k[hits[0]])
+        return k * (k + 1) // 2
+    return None
+
 """
     Finds the smallest number that can be divided by all numbers 1 ... n
 """
@@ -88,34 +434,56 @@ def smallest_multiple(n):
         # Does a union: ((2, 2)) U ((2, 3), (3,2)) => ((2, 3), (3, 2))
         # Where the first number is a prime and the second is the 
         # number of occurrences
-        primes = primes | Counter(prime_factors(i))
+        primes = primes | Counter(dict(factorize(i)))
     smallest_mult = 1
     for item in primes.items():
         smallest_mult *= item[0]**item[1]
     return smallest_mult
 
 
-# Yields the next prime number
-# But is way too slow if calculating a large number of primes
+# Yields the next prime number, without an upper bound
+# Sieves [lo, hi) ranges that double in length each time they run out,
+# so the total work is at most twice that of sieving up to the last prime yielded
 def generate_primes():
-    primes = [2]
+    lo, hi = 0, 2 * SIEVE_SEGMENT_SIZE
     while True:
-        current_prime = primes[-1]
-        yield current_prime
-        num = current_prime
-        number_primes = len(primes)
-        while current_prime == primes[-1]:
-            num += 1
-            j = 0
-            while j < number_primes:
-                if num % primes[j] == 0:
-                    break
-                j += 1
-            if j == number_primes:
-                primes.append(num)
+        for primes in sieve_segments(hi, lo=lo):
+            yield from primes.tolist()
+        lo, hi = hi, 2 * hi
 
-# Returns an array of all primes 2<= p <n
-def sieve_of_erastothenes(n):
+"""
+    Returns the k-th prime, counting from nth_prime(1) = 2
+
+    Uses the bound p_k < k(ln k + ln ln k), valid for k >= 6, to
+    decide how far to sieve before counting primes window by window
+"""
+def nth_prime(k):
+    if k < 1:
+        raise ValueError('k must be a positive integer')
+    if k < 6:
+        return [2, 3, 5, 7, 11][k - 1]
+    bound = int(k * (math.log(k) + math.log(math.log(k)))) + 1
+    count = 0
+    for primes in sieve_segments(bound):
+        if count + len(primes) >= k:
+            return int(primes[k - count - 1])
+        count += len(primes)
+
+# Number of odd numbers covered by one window of the segmented sieve.
+# One byte per odd number keeps a window inside a typical L2 cache
+SIEVE_SEGMENT_SIZE = 2**18
+
+# Returns an array of all primes lo <= p < n
+# Passing lo or segment_size sieves [lo, n) in bounded windows
+# instead of allocating one n//3 array
+def sieve_of_erastothenes(n, lo=0, segment_size=None):
+    if lo or segment_size:
+        segments = list(sieve_segments(n, lo=lo, segment_size=segment_size or SIEVE_SEGMENT_SIZE))
+        if not segments:
+            return np.array([], dtype=np.int64)
+        return np.concatenate(segments)
+    if n < 4:
+        return np.array([p for p in (2, 3) if p < n], dtype=np.int64)
     sieve = np.ones(n//3 + (n%6==2), dtype=bool)
     for i in range(1, int(((n**0.5)//3) + 1)):
         if sieve[i]:
@@ -124,25 +492,158 @@ def sieve_of_erastothenes(n):
             sieve[k*(k-2*(i&1)+4)//3::2*k] = False
     return np.r_[2, 3, ((3*np.nonzero(sieve)[0][1:]+1)|1)]
 
-# number_list: a list of integers that represent a long number
+"""
+    Yields the primes lo <= p < hi as NumPy arrays, one window at a time
+
+    Each window only stores the odd numbers in it, so memory use is
+    bounded by segment_size no matter how large hi is. The primes used
+    for crossing off are the ones below sqrt(hi), found with the plain sieve.
+"""
+def sieve_segments(hi, lo=0, segment_size=SIEVE_SEGMENT_SIZE):
+    lo = max(lo, 0)
+    if hi <= lo or hi < 3:
+        return
+    if lo <= 2:
+        yield np.array([2], dtype=np.int64)
+    base_primes = sieve_of_erastothenes(math.isqrt(hi - 1) + 1)[1:].tolist()
+
+    # Windows start on an even number, window index i is the odd number start + 2*i + 1
+    start = lo - lo % 2
+    while start < hi:
+        end = min(start + 2 * segment_size, hi + hi % 2)
+        segment = np.ones((end - start)//2, dtype=bool)
+        if start == 0:
+            segment[0] = False
+        for p in base_primes:
+            if p * p >= end:
+                break
+            # First odd multiple of p that is inside the window and not below p^2
+            multiple = max(p * p, -(-(start + 1) // p) * p)
+            if multiple % 2 == 0:
+                multiple += p
+            segment[(multiple - start - 1)//2::p] = False
+        primes = start + 1 + 2 * np.nonzero(segment)[0].astype(np.int64)
+        if start < lo or end > hi:
+            primes = primes[(primes >= lo) & (primes < hi)]
+        if len(primes):
+            yield primes
+        start = end
+
+# Exponents of 2, 3, 5 and 7 in each of the digits 0-9
+DIGIT_EXPONENTS = np.array([[0, 0, 0, 0], [0, 0, 0, 0], [1, 0, 0, 0], [0, 1, 0, 0], [2, 0, 0, 0],
+                            [0, 0, 1, 0], [1, 1, 0, 0], [0, 0, 0, 1], [3, 0, 0, 0], [0, 2, 0, 0]], dtype=np.int32)
+
+# Returns the digits in a bytes or str buffer as a uint8 array,
+# skipping everything else (such as line breaks)
+def digits_from_buffer(buffer):
+    if isinstance(buffer, str):
+        buffer = buffer.encode()
+    raw = np.frombuffer(buffer, dtype=np.uint8)
+    return raw[(raw >= ord('0')) & (raw <= ord('9'))] - ord('0')
+
+def read_digits(path):
+    with open(path, 'rb') as digit_file:
+        return digits_from_buffer(digit_file.read())
+
+# number_list: the digits of a long number, as a list, array, or bytes/str buffer
 # n: # of digits to take the product of
 # returns: max, digits
-#   where max: max product of all n-digit combinations
-#         digits: the digits that generate the max 
+#   where max: max product of all n-digit combinations, as an exact int
+#         digits: the digits that generate the max
+#
+# Every window product is 2^a 3^b 5^c 7^d, so prefix sums of those exponents (and of
+# the zeros, which rule a window out) give every window's product in one linear pass.
+# Windows are ranked by log, and the leaders are compared exactly with big ints, so
+# long windows whose products overflow int64 are still exact
 def largest_product_in_series(number_list, n):
-    number_digits = len(number_list)
+    if isinstance(number_list, (bytes, bytearray, str)):
+        digits = digits_from_buffer(number_list)
+    else:
+        digits = np.asarray(number_list, dtype=np.uint8)
+    if n < 1 or len(digits) < n:
+        return 0, []
+
+    prefix = np.zeros((len(digits) + 1, 5), dtype=np.int32)
+    np.cumsum(DIGIT_EXPONENTS[digits], axis=0, out=prefix[1:, :4])
+    np.cumsum(digits == 0, out=prefix[1:, 4])
+    windows = prefix[n:] - prefix[:-n]
+    valid = np.flatnonzero(windows[:, 4] == 0)
+    if not len(valid):
+        return 0, []
+
+    exponents = windows[valid, :4]
+    logs = exponents @ np.log([2, 3, 5, 7])
+    leaders = np.flatnonzero(logs >= logs.max() - 1e-9 * max(1, logs.max()))
+    candidates, first = np.unique(exponents[leaders], axis=0, return_index=True)
+    products = [2**a * 3**b * 5**c * 7**d for a, b, c, d in candidates.tolist()]
+    best = max(range(len(products)), key=lambda k: (products[k], -first[k]))
+    start = int(valid[leaders[first[best]]])
+    return products[best], digits[start:start + n].tolist()
+
+# Yields every primitive triple (a, b, c), a < b, with a + b + c <= max_perimeter.
+# Euclid's formula: for m > n > 0 with m - n odd and gcd(m, n) = 1,
+# (m^2 - n^2, 2mn, m^2 + n^2) is primitive, has perimeter 2m(m + n), and every
+# primitive triple comes from exactly one such pair
+def primitive_triples(max_perimeter):
+    m = 2
+    while 2*m*(m + 1) <= max_perimeter:
+        for n in range(1 + m % 2, m, 2):
+            if 2*m*(m + n) > max_perimeter:
+                break
+            if math.gcd(m, n) == 1:
+                a, b = m*m - n*n, 2*m*n
+                yield min(a, b), max(a, b), m*m + n*n
+        m += 1
+
+# Returns all triples (a, b, c), a < b < c, with a + b + c = s, by increasing a.
+# Each is k times the primitive triple of some (m, n) with k * 2m(m + n) = s,
+# so only divisors m of s/2 and divisors m + n (between m and 2m) of s/(2m)
+# need to be tried
+def triples_with_perimeter(s):
+    triples = []
+    if s <= 0 or s % 2:
+        return triples
+    half = s // 2
+    for m in iter_divisors(half, ordered=True):
+        if m*(m + 1) > half:
+            break
+        t = half // m
+        for d in iter_divisors(t, ordered=True):
+            if d >= 2*m:
+                break
+            n = d - m
+            if n > 0 and n % 2 != m % 2 and math.gcd(m, n) == 1:
+                k = t // d
+                a, b = k*(m*m - n*n), k*2*m*n
+                triples.append((min(a, b), max(a, b), k*(m*m + n*n)))
+    triples.sort()
+    return triples
 
-    products = [number_list[i:i+n] for i in range(number_digits-n)]
-    max = 0
-    digits = []
-    for i in products:
-        prod = np.prod(i)
-        if prod > max:
-            max, digits = prod, i
-    return max, digits
+# Returns counts where counts[p] is the number of triples with perimeter p, p <= n.
+# All (m, n) pairs are laid out at once with np.repeat, and each primitive
+# perimeter is then repeated once per multiple of it that is <= n, so a single
+# bincount does the counting
+def triangle_perimeter_counts(n):
+    m_max = math.isqrt(n // 2)
+    ms = np.arange(2, m_max + 1, dtype=np.int64)
+    # For each m, the pairs (m, j) with 1 <= j < m and 2m(m + j) <= n
+    per_m = np.clip(np.minimum(ms - 1, n // (2*ms) - ms), 0, None)
+    m = np.repeat(ms, per_m)
+    j = np.arange(len(m), dtype=np.int64) - np.repeat(np.cumsum(per_m) - per_m, per_m) + 1
+    primitive = ((m - j) % 2 == 1) & (np.gcd(m, j) == 1)
+    perimeters = (2*m*(m + j))[primitive]
+    multiples = n // perimeters
+    k = np.arange(multiples.sum(), dtype=np.int64) - np.repeat(np.cumsum(multiples) - multiples, multiples) + 1
+    return np.bincount(np.repeat(perimeters, multiples) * k, minlength=n + 1)
 
-def rel_a_to_b(a, s):
-    return (s**2 - 2*a*s)/(2*s - 2*a)
+"""If p is the perimeter of a right angle triangle with integral length sides,
+{a,b,c}, there are exactly three solutions for p = 120.
+
+    {20,48,52}, {24,45,51}, {30,40,50}
+
+For which value of p <= 1000, is the number of solutions maximised?"""
+def most_triangle_solutions(n):
+    return int(np.argmax(triangle_perimeter_counts(n)))
 
 """A Pythagorean triplet is a set of three natural numbers, a < b < c, for which,
 
@@ -152,94 +653,190 @@ def rel_a_to_b(a, s):
 There exists exactly one Pythagorean triplet for which a + b + c = 1000.
 Find the product abc."""
 def pythagorean_triplet(s):
-    """Rearranging the two equations, I get:
-        b = (s/2 - a)/(1 + a/s)
-    
-    We also know for triangles that the sum of two sides must always 
-    be longer than the third, so that we can go from 1 to s/2
+    """Returns (abc, a, b, c) in exact integers for the triple with perimeter s
+    and the smallest a, or None if there is none.
     """
-    for a in range(1, math.ceil(s/2)):
-        b = rel_a_to_b(a, s)
-        if (b).is_integer():
-            c = math.sqrt(a**2 + b**2)
+    triples = triples_with_perimeter(s)
+    if not triples:
+        return None
+    a, b, c = triples[0]
+    return a*b*c, a, b, c
 
-            if c.is_integer():
-                d = a + b + c
-                if d == s:
-                    return a*b*c, a, b, c
 
-    return None
+# Compares n with its digits reversed, without going through a string
+def check_palindrome(pal):
+    return pal >= 0 and reverse_digits(pal) == pal
 
+def reverse_digits(n):
+    reverse = 0
+    while n:
+        n, digit = divmod(n, 10)
+        reverse = 10*reverse + digit
+    return reverse
 
-def check_palindrome(pal):
-    pal_string = str(pal)
-    pal_length = len(pal_string)
-    for i in range(math.floor(pal_length/2)):
-        if pal_string[i] != pal_string[pal_length-1-i]:
-            return False
-    return True
+# Palindromes (left halves) per task of the parallel top-down search
+PALINDROME_BLOCK = 64
 
 # d: number of digits
-def palindrome_product(d):
+# Returns the largest palindrome i * j with 1 <= j <= i <= 99...9 (d nines)
+# top_down: walks the palindromes downwards and returns the first with a factor pair,
+#   which is much faster for large d
+# workers: runs the top-down walk in processes, each taking the next block of
+#   PALINDROME_BLOCK palindromes. Splitting the bottom-up search by the larger factor
+#   does not scale, since each chunk would need to find a good bound on its own
+def palindrome_product(d, workers=1, top_down=False):
     init = int("9" * d)
-    pals = []
-    for i in range(init, 0, -1):
-        for j in range(init, 0, -1):
+    if top_down or worker_count(workers) > 1:
+        return parallel_first(_largest_palindrome_in_block, _palindrome_blocks(init), workers=workers) or 0
+    return _largest_palindrome_in(1, init + 1)
+
+# Largest palindrome i * j with j <= i and lo <= i < hi, or 0
+# Both loops run downwards and stop as soon as they can no longer beat the best so far.
+# Once the best has an even number of digits, so does anything that beats it, and
+# such palindromes are multiples of 11, so j only needs to visit multiples of 11
+# unless i is one
+def _largest_palindrome_in(lo, hi):
+    best = 0
+    for i in range(hi - 1, lo - 1, -1):
+        if i * i <= best:
+            break
+        j, step = i, 1
+        # A palindrome beating best with an even digit count is a multiple of 11,
+        # but only while no product left here can have more digits than best
+        digits = len(str(best))
+        if i % 11 and digits % 2 == 0 and i * i < 10**digits:
+            j, step = i - i % 11, 11
+        for j in range(j, best // i, -step):
             pal = i * j
             if check_palindrome(pal):
-                pals.append(pal)
-    return max(pals)
+                best = pal
+                break
+    return best
+
+# Blocks (init, length, top, bottom) covering the palindromes that could be
+# a product of two factors <= init, from the largest down. A block holds the
+# palindromes of length digits whose left halves run from top down to bottom (exclusive)
+def _palindrome_blocks(init):
+    for length in range(2 * len(str(init)), 0, -1):
+        half = (length + 1) // 2
+        for top in range(10**half - 1, 10**(half - 1) - 1, -PALINDROME_BLOCK):
+            yield init, length, top, max(top - PALINDROME_BLOCK, 10**(half - 1) - 1)
+
+# Largest palindrome in the block with a factor pair <= init, or None
+def _largest_palindrome_in_block(init, length, top, bottom):
+    half = (length + 1) // 2
+    for left in range(top, bottom, -1):
+        pal = left * 10**(length // 2) + reverse_digits(left // 10**(half - length // 2))
+        if _has_factor_pair(pal, init):
+            return pal
+    return None
+
+# Whether pal = f * g for some f, g <= init
+def _has_factor_pair(pal, init):
+    lo = -(-pal // init)
+    if lo > init:
+        return False
+    if pal % 11 == 0:
+        # 11 is prime, so one of f, g is a multiple of it, and both lie in [lo, init]
+        start, step = -(-lo // 11) * 11, 11
+    else:
+        # Otherwise it is enough to look for the larger factor of the pair
+        start, step = max(lo, math.isqrt(pal - 1) + 1), 1
+    if pal < 2**63:
+        factors = np.arange(start, init + 1, step, dtype=np.int64)
+        return bool((pal % factors == 0).any())
+    return any(pal % f == 0 for f in range(start, init + 1, step))
+
+# workers: sieves contiguous ranges below n in separate processes
+def sum_primes_below(n, workers=1):
+    chunks = split_range(0, n, PARALLEL_CHUNKS_PER_WORKER * worker_count(workers))
+    return parallel_reduce(_sum_primes_in, chunks, operator.add, workers=workers)
+
+def _sum_primes_in(lo, hi):
+    total = 0
+    for primes in sieve_segments(hi, lo=lo):
+        total += int(primes.sum())
+    return total
+
+# How the window moves from one number to the next, for each direction grid_product checks
+GRID_DIRECTIONS = {'right': (0, 1), 'down': (1, 0), 'diagonal_right': (1, 1), 'diagonal_left': (1, -1)}
 
-def sum_primes_below(n):
-    primes = sieve_of_erastothenes(n)
-    return sum(primes)
+# Rows of window starts grid_product_location multiplies out at once,
+# which bounds its working memory on very large grids
+GRID_BLOCK_ROWS = 1024
+
+"""
+Grid: a rectangular matrix of numbers
+Returns: greatest product of k adjacent numbers (up, down, left, right, or diagonal)
+"""
+def grid_product(grid, k=4):
+    return grid_product_location(grid, k)[0]
 
 """
-Grid: 20x20 matrix
-Returns: greatest product of four adjacent numbers (up, down, left, right, or diagonal)
+Returns: (product, row, column, direction) for the greatest product of k adjacent
+numbers, where the window starts at grid[row][column] and runs in one of the
+GRID_DIRECTIONS. Windows that do not fit give (0, None, None, None)
 """
-def grid_product(grid):
+def grid_product_location(grid, k=4):
     """
     Algorithm:
-        Sufficient to check: right, down, and diagonal
+        Sufficient to check: right, down, and both diagonals going down.
+        For each direction, the products of all windows are built by multiplying
+        k shifted views of the grid together, one block of rows at a time.
+        If k of the largest numbers could overflow int64, log sums are
+        compared instead, and the windows whose logs are within a relative
+        tolerance of the largest are compared by their exact products
     """
-    max_prod = 0
-    grid_length = len(grid)
-    for i in range(grid_length):
-        row_length = len(grid[i])
-        for j in range(row_length):
-            the_point = grid[i][j]
-
-            # To the right
-            right_prod = 0
-            if j < row_length - 4:
-                right_prod = np.prod(grid[i][j:j+4])
-            
-            # Down
-            down_prod = 0
-            if i < grid_length - 4:
-                down_prod = the_point
-                for k in range(1, 4):
-                    down_prod *= grid[i+k][j]
-
-            # Diagonal
-            diagonal_right_prod = 0
-            if j < row_length - 4 and i < grid_length - 4:
-                diagonal_right_prod = the_point
-                for k in range(1, 4):
-                    diagonal_right_prod *= grid[i+k][j+k]
-
-            diagonal_left_prod = 0
-            if j - 3 >= 0 and i < grid_length - 4:
-                diagonal_left_prod = the_point
-                for k in range(1, 4):
-                    diagonal_left_prod *= grid[i+k][j-k]
-            prods = [right_prod, diagonal_right_prod, diagonal_left_prod, down_prod]
-
-            max_of_four = max(prods)
-            if max_of_four > max_prod:
-                max_prod = max_of_four
-    return max_prod
+    grid = np.asarray(grid)
+    rows, cols = grid.shape
+    exact = grid.size == 0 or int(np.abs(grid).max()) ** k < 2**63
+    if exact:
+        values = grid.astype(np.int64)
+    elif grid.min() < 0:
+        raise ValueError('Grids with negative numbers must have products that fit in int64')
+    else:
+        with np.errstate(divide='ignore'):
+            values = np.log(grid.astype(np.float64))
+
+    best, best_log, location = None, -np.inf, (None, None, None)
+    for direction, (dr, dc) in GRID_DIRECTIONS.items():
+        start_rows = rows - dr * (k - 1)
+        col_lo, col_hi = max(0, -dc * (k - 1)), cols - max(0, dc * (k - 1))
+        if k < 1 or start_rows <= 0 or col_hi <= col_lo:
+            continue
+        for r0 in range(0, start_rows, GRID_BLOCK_ROWS):
+            r1 = min(start_rows, r0 + GRID_BLOCK_ROWS)
+            window = values[r0:r1, col_lo:col_hi].copy()
+            for t in range(1, k):
+                shifted = values[r0 + t*dr:r1 + t*dr, col_lo + t*dc:col_hi + t*dc]
+                if exact:
+                    window *= shifted
+                else:
+                    window += shifted
+            if exact:
+                near = [int(np.argmax(window))]
+            else:
+                # Log sums can misorder products that agree to ~16 digits, so every
+                # window close to the largest log so far is multiplied out exactly
+                best_log = max(best_log, window.max())
+                if np.isfinite(best_log):
+                    near = np.flatnonzero(window >= best_log - 1e-9 * max(1, best_log)).tolist()
+                else:
+                    # Every window so far holds a zero
+                    near = [0]
+            for index in near:
+                row, column = divmod(index, col_hi - col_lo)
+                row, column = r0 + row, col_lo + column
+                product = window.flat[index] if exact else math.prod(int(grid[row + t*dr, column + t*dc]) for t in range(k))
+                if best is None or product > best:
+                    best, location = product, (row, column, direction)
+
+    row, column, direction = location
+    if direction is None:
+        return 0, None, None, None
+    dr, dc = GRID_DIRECTIONS[direction]
+    product = math.prod(int(grid[row + t*dr, column + t*dc]) for t in range(k))
+    return product, row, column, direction
 
 
 
@@ -249,8 +846,8 @@ Nums is a list of length-n numbers, which are written as lists:
 
 Returns: The first ten digits of the sum of these numbers
 
-TODO: This could be improved by summing progressively more digits 
-        until the value of the first ten digits converges
+first_digits_of_sum sums progressively more digits until the leading
+digits converge, and reads the numbers straight from a file
 """
 def first_ten_large_nums(nums, digits):
     sum = 0
@@ -261,39 +858,206 @@ def first_ten_large_nums(nums, digits):
  
     return sum
 
+# Lines large_nums_column_sums reads and stacks into digit arrays at a time
+LARGE_NUMS_BLOCK_LINES = 2**16
+
+"""
+Lines: an iterable of numbers written as bytes or str lines, such as an open file
+
+Returns: (column_sums, count) where column_sums[j] is the sum of the 10^j digits
+of all the numbers, and count is how many numbers there were
+
+Each block of lines is grouped by length and stacked into 2-D digit arrays with
+np.frombuffer, then summed down the columns, so no per-digit lists are built
+"""
+def large_nums_column_sums(lines, block_lines=LARGE_NUMS_BLOCK_LINES):
+    lines = iter(lines)
+    column_sums = np.zeros(0, dtype=np.int64)
+    count = 0
+    for block in iter(lambda: list(itertools.islice(lines, block_lines)), []):
+        by_length = {}
+        for line in block:
+            if isinstance(line, str):
+                line = line.encode()
+            line = line.strip()
+            if line:
+                by_length.setdefault(len(line), []).append(line)
+        for length, numbers in by_length.items():
+            digits = np.frombuffer(b''.join(numbers), dtype=np.uint8).reshape(len(numbers), length) - ord('0')
+            if length > len(column_sums):
+                column_sums = np.r_[column_sums, np.zeros(length - len(column_sums), dtype=np.int64)]
+            column_sums[:length] += digits.sum(axis=0, dtype=np.int64)[::-1]
+            count += len(numbers)
+    return column_sums, count
+
+"""
+Returns: the first k digits of the sum whose columns are column_sums
+
+Adds the columns in from the most significant one. With r columns left to add,
+the running value V is the sum divided by 10^r, less what the remaining
+columns add, which is under count. So the true prefix lies in [V, V + count),
+and once V and V + count - 1 agree on their first k digits those are final
+"""
+def leading_digits_of_sum(column_sums, count, k):
+    value = 0
+    for remaining in range(len(column_sums) - 1, -1, -1):
+        value = 10*value + int(column_sums[remaining])
+        low, high = str(value), str(value + count - 1)
+        if len(low) == len(high) >= k and low[:k] == high[:k]:
+            return int(low[:k])
+    return int(str(value)[:k])
+
+"""
+Source: a file path, or an iterable of bytes/str lines, of numbers of any length
+
+Returns: the first k digits of the sum of the numbers
+"""
+def first_digits_of_sum(source, k=10):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as numbers:
+            return leading_digits_of_sum(*large_nums_column_sums(numbers), k)
+    return leading_digits_of_sum(*large_nums_column_sums(source), k)
+
+# Entries kept for sequence values >= n by the one-start-at-a-time Collatz engine
+COLLATZ_OVERFLOW_CACHE_SIZE = 2**16
+
+# Largest block of starts the batch Collatz engine advances at once
+COLLATZ_BATCH_SIZE = 2**20
+
 """
-This can be optimized further to 
-skip certain numbers that will surely yield short sequences
+Returns: an int32 array where lengths[k] is the number of terms in the
+Collatz sequence starting at k, for all 0 < k < n
+
+An even k just takes one more step than k/2, so only odd starts are walked.
+batch=True walks whole blocks of odd starts at once with NumPy. Otherwise
+each odd start is walked on its own, with values >= n remembered in a
+bounded overflow cache
+
+Sequence values must stay below 2^63, which holds for all starts below 10^11
 """
-def find_longest_collatz_under(n):
-    lengths = {1: 1}
+def collatz_lengths(n, batch=True):
+    if batch:
+        lengths = np.zeros(max(n, 2), dtype=np.int32)
+        lengths[1] = 1
+        lo = 2
+        while lo < n:
+            # Capping hi at 2*lo means every even k in the block halves to below lo
+            hi = min(n, 2 * lo, lo + COLLATZ_BATCH_SIZE)
+            evens = np.arange(lo + lo % 2, hi, 2)
+            lengths[evens] = lengths[evens // 2] + 1
+            odds = np.arange(lo + 1 - lo % 2, hi, 2)
+            lengths[odds] = _collatz_lengths_from(odds, lo, lengths)
+            lo = hi
+        return lengths
+
+    lengths = array('i', bytes(4 * max(n, 2)))
+    lengths[1] = 1
+    overflow = {}
     for i in range(2, n):
-        if i not in lengths:
-            # All numbers 2^k will terminate quickly (i.e.: 8 -> 4 -> 2 -> 1 )
-            log = math.log(i, 2)
-            if (log).is_integer():
-                lengths[i] = int(log) + 1
-            else:
-                c = collatz_sequence(i)
-                c_list = []
-                for j in c:
-                    # Do not repeat calculations
-                    # Eventually you will reach 1 and this operation will be performed
-                    # This is the crucial step that speeds up the calculation
-                    # This sped up my code by a factor of 10
-                    if j in lengths:
-                        j_length = lengths[j]
-                        current_c_list_length = len(c_list)
-                        for k in range(current_c_list_length):
-                            # The length of the sequence starting at c_list[k]
-                            # will be the length of the sequence starting at j, plus 
-                            # the number of sequence elements already generated (current_c_list_length)
-                            # minus the index of the current element (k)
-                            lengths[c_list[k]] = j_length + current_c_list_length - k
-                        break
-                    c_list.append(j)
-    max_length = max(lengths.items(), key=operator.itemgetter(1))
-    return max_length
+        if i % 2 == 0:
+            lengths[i] = lengths[i >> 1] + 1
+            continue
+        if lengths[i]:
+            continue
+        # Everything below i is already known, so the walk ends once it drops below i
+        path = []
+        x = i
+        while True:
+            if x < n:
+                if lengths[x]:
+                    length = lengths[x]
+                    break
+            elif x in overflow:
+                length = overflow[x]
+                break
+            path.append(x)
+            x = 3*x + 1 if x % 2 else x >> 1
+        for x in reversed(path):
+            length += 1
+            if x < n:
+                lengths[x] = length
+            elif len(overflow) < COLLATZ_OVERFLOW_CACHE_SIZE:
+                overflow[x] = length
+    return np.frombuffer(lengths, dtype=np.int32)
+
+"""
+Returns: the Collatz lengths of the odd starts, each of which is >= limit
+
+Advances every start at once, folding 3x + 1 and the halving that must
+follow it into one (3x + 1)/2 step, and retires a start once its value is
+below limit, where lengths is already filled in. A value that has just
+dropped below limit is still >= limit/2, so it cannot reach 1 for another
+log2(limit) - 1 steps, and the (costly) check only runs that often
+"""
+def _collatz_lengths_from(starts, limit, lengths):
+    result = np.empty(len(starts), dtype=np.int32)
+    x = starts.astype(np.int64)
+    # Every start has taken the same number of steps plus one extra per odd value
+    iterations = 0
+    odd_steps = np.zeros(len(starts), dtype=np.int64)
+    index = np.arange(len(starts))
+    check_every = max(1, min(8, limit.bit_length() - 2))
+    retired = 0
+    while len(x):
+        for _ in range(check_every):
+            odd = x & 1
+            odd_steps += odd
+            odd *= 2*x + 1
+            x += odd
+            x >>= 1
+        iterations += check_every
+        done = np.flatnonzero((x < limit) & (x != 0))
+        if len(done):
+            result[index[done]] = iterations + odd_steps[done] + lengths[x[done]]
+            # Retired starts are parked on 0, which maps to itself, and only
+            # swept out once they are a sizeable share of the frontier
+            x[done] = 0
+            retired += len(done)
+            if 4 * retired > len(x):
+                remaining = x != 0
+                x, odd_steps, index = x[remaining], odd_steps[remaining], index[remaining]
+                retired = 0
+    return result
+
+"""
+Returns: (start, length) for the start below n with the longest Collatz
+sequence, taking the smallest start on ties
+
+With workers > 1, starts from COLLATZ_BATCH_SIZE up are split into ranges
+that are batch stepped in separate processes. Each process builds its own
+length table below COLLATZ_BATCH_SIZE once, and finishes all of its ranges
+against it
+"""
+def find_longest_collatz_under(n, batch=True, workers=1):
+    workers = worker_count(workers)
+    base = n if workers == 1 else min(n, COLLATZ_BATCH_SIZE)
+    lengths = collatz_lengths(base, batch=batch)
+    start = int(np.argmax(lengths))
+    best = start, int(lengths[start])
+    if base >= n:
+        return best
+    chunks = [(lo, hi, base) for lo, hi in split_range(base, n, PARALLEL_CHUNKS_PER_WORKER * workers)]
+    return _longer_collatz(best, parallel_reduce(_longest_collatz_in, chunks, _longer_collatz, workers=workers))
+
+# (start, length) of the longest Collatz sequence with lo <= start < hi,
+# finishing sequences against a length table of everything below base <= lo
+def _longest_collatz_in(lo, hi, base):
+    lengths = _collatz_lengths_from(np.arange(lo, hi), base, _cached_collatz_lengths(base))
+    start = int(np.argmax(lengths))
+    return lo + start, int(lengths[start])
+
+# (base, lengths) of the last table built in this process, shared by its chunks
+_collatz_base_table = None
+
+def _cached_collatz_lengths(base):
+    global _collatz_base_table
+    if _collatz_base_table is None or _collatz_base_table[0] != base:
+        _collatz_base_table = base, collatz_lengths(base)
+    return _collatz_base_table[1]
+
+# Keeps the earlier (smaller) start on ties, like np.argmax
+def _longer_collatz(a, b):
+    return b if b[1] > a[1] else a
 
 
 """
@@ -343,87 +1107,230 @@ def dfs(matrix, start, path):
         return [path]
     return paths
 
+"""
+Lattice paths on an s x t grid of squares, moving only right and down from the
+top-left corner to the bottom-right one. The (s+1) x (t+1) corners are the
+nodes, numbered row by row like create_adjacency_matrix, and blocked is an
+iterable of (row, column) nodes that paths may not pass through
+"""
+def _lattice_blocked_mask(s, t, blocked):
+    mask = np.zeros((s + 1, t + 1), dtype=bool)
+    for i, j in blocked or ():
+        mask[i, j] = True
+    return mask
+
+"""
+Returns: (indptr, indices), the lattice's adjacency in CSR form, so the nodes
+reachable in one step from node l are indices[indptr[l]:indptr[l+1]]
+"""
+def lattice_adjacency(s, t=None, blocked=None):
+    t = s if t is None else t
+    mask = _lattice_blocked_mask(s, t, blocked)
+    nodes = np.arange((s + 1) * (t + 1)).reshape(s + 1, t + 1)
+    targets = np.stack([nodes + 1, nodes + t + 1], axis=-1)
+    valid = np.zeros((s + 1, t + 1, 2), dtype=bool)
+    valid[:, :-1, 0] = ~mask[:, :-1] & ~mask[:, 1:]
+    valid[:-1, :, 1] = ~mask[:-1, :] & ~mask[1:, :]
+    indptr = np.r_[0, np.cumsum(valid.reshape(-1, 2).sum(axis=1))]
+    return indptr, targets[valid]
+
+"""
+Returns: the number of lattice paths, as an exact int
+
+Dynamic programming over one rolling row: the paths into a node are
+the paths into the node above plus those into the node to its left
+"""
+def count_lattice_paths(s, t=None, blocked=None):
+    t = s if t is None else t
+    blocked = set(blocked or ())
+    row = [0] * (t + 1)
+    for i in range(s + 1):
+        for j in range(t + 1):
+            if (i, j) in blocked:
+                row[j] = 0
+            elif i == 0 and j == 0:
+                row[j] = 1
+            elif j > 0:
+                row[j] += row[j - 1]
+    return row[t]
+
+"""
+Yields: every lattice path as a list of node numbers, one at a time,
+in the same order and format as dfs(matrix, 0, [0])
+"""
+def iter_lattice_paths(s, t=None, blocked=None):
+    t = s if t is None else t
+    blocked = set(blocked or ())
+    if (0, 0) in blocked or (s, t) in blocked:
+        return
+    indptr, indices = lattice_adjacency(s, t, blocked)
+    end = len(indptr) - 2
+    if end == 0:
+        yield [0]
+        return
+    path = [0]
+    stack = [iter(indices[indptr[0]:indptr[1]].tolist())]
+    while stack:
+        node = next(stack[-1], None)
+        if node is None:
+            stack.pop()
+            path.pop()
+        elif node == end:
+            yield [*path, node]
+        else:
+            path.append(node)
+            stack.append(iter(indices[indptr[node]:indptr[node + 1]].tolist()))
+
+"""
+Weights: a matrix of numbers, one per node
+Returns: the smallest sum of weights along a path from the top-left node to the
+bottom-right one moving right and down, or None if blocked cells cut them off
+
+Row by row, the best sum into column j is
+    min over k <= j of (best into k from above) + weights[k..j]
+which one cumsum and one np.minimum.accumulate give for a whole run of
+unblocked cells at once
+"""
+def min_path_sum(weights, blocked=None):
+    weights = np.asarray(weights)
+    rows, cols = weights.shape
+    mask = _lattice_blocked_mask(rows - 1, cols - 1, blocked)
+    if weights.dtype.kind == 'f':
+        dtype, unreachable, limit = np.float64, np.inf, np.inf
+    else:
+        # Integer sums are kept exact: every path sum, and every run of a row,
+        # lies within +-bound, so cells that no path reaches start at 2 * bound + 1
+        # and stay above bound. Sums of at most 5 * bound + 1 come up, and past
+        # int64 Python ints are used
+        largest = max(abs(int(weights.max())), abs(int(weights.min()))) if weights.size else 0
+        bound = largest * (rows + cols)
+        unreachable, limit = 2 * bound + 1, bound + 1
+        dtype = np.int64 if weights.dtype.kind in 'iu' and 5 * bound + 1 < 2**63 else object
+    above = np.full(cols, unreachable, dtype=dtype)
+    above[0] = 0
+    for i in range(rows):
+        row = np.full(cols, unreachable, dtype=dtype)
+        open_cols = np.flatnonzero(~mask[i])
+        for run in np.split(open_cols, np.flatnonzero(np.diff(open_cols) > 1) + 1):
+            if len(run):
+                lo, hi = run[0], run[-1] + 1
+                w = weights[i, lo:hi].astype(dtype)
+                prefix = np.cumsum(w)
+                row[lo:hi] = prefix + np.minimum.accumulate(above[lo:hi] - prefix + w)
+        above = row
+    if above[-1] >= limit:
+        return None
+    return float(above[-1]) if dtype is np.float64 else int(above[-1])
+
+# Maps the bytes 0 and 1 to the characters '0' and '1', and back
+_BITS_TO_DIGITS = bytes.maketrans(b'\x00\x01', b'01')
+_DIGITS_TO_BITS = bytes.maketrans(b'01', b'\x00\x01')
+
+"""
+A non-negative integer backed by a Python int, so addition and subtraction
+are O(n) in the number of bits. Converts to and from the lists of bits,
+most significant first, that my_add, subtract and long_division work on
+"""
+@functools.total_ordering
+class BitVector(object):
+    __slots__ = ('value',)
+
+    def __init__(self, value=0):
+        if value < 0:
+            raise ValueError('Negative values are not valid')
+        self.value = value
+
+    @classmethod
+    def from_bits(cls, bits):
+        digits = bytes(bits).translate(_BITS_TO_DIGITS)
+        return cls(int(digits, 2) if digits else 0)
+
+    def to_bits(self):
+        return list(format(self.value, 'b').encode().translate(_DIGITS_TO_BITS))
+
+    def __len__(self):
+        return self.value.bit_length()
+
+    def __add__(self, other):
+        return BitVector(self.value + other.value)
+
+    def __sub__(self, other):
+        return BitVector(self.value - other.value)
+
+    def __lshift__(self, n):
+        return BitVector(self.value << n)
+
+    def __rshift__(self, n):
+        return BitVector(self.value >> n)
+
+    def __eq__(self, other):
+        return isinstance(other, BitVector) and self.value == other.value
+
+    def __lt__(self, other):
+        return self.value < other.value
+
+    def __hash__(self):
+        return hash(self.value)
+
+    """
+    Binary long division: lines the divisor up under the top of the
+    dividend and shifts it down one bit at a time, subtracting wherever
+    it fits. That is one O(n) subtraction per quotient bit, O(n^2) in all
+    """
+    def __divmod__(self, other):
+        if not other.value:
+            raise ValueError('Cannot divide by zero')
+        shift = self.value.bit_length() - other.value.bit_length()
+        quotient, remainder = 0, self.value
+        divisor = other.value << max(shift, 0)
+        for _ in range(shift + 1):
+            quotient <<= 1
+            if remainder >= divisor:
+                remainder -= divisor
+                quotient |= 1
+            divisor >>= 1
+        return BitVector(quotient), BitVector(remainder)
+
+    def __repr__(self):
+        return 'BitVector(0b' + format(self.value, 'b') + ')'
+
 """
 a and b are lists that begin with 1
 """
 def greater_than(a, b):
-    if len(a) > len(b):
-        return True
-    if len(a) < len(b):
-        return False
-    if a == b:
-        return False
-    for i in range(len(a)):
-        if a[i] < b[i]:
-            return False
-    return True
+    return BitVector.from_bits(a) > BitVector.from_bits(b)
 
 def my_bit_add(a, b, c):
-    if a and b and c:
-        return [1, 1]
-    if (a and b) or (a and c):
-        return [1, 0]
-    if a or b or c:
-        return [0, 1]
-    return [0, 0]
+    total = bool(a) + bool(b) + bool(c)
+    return [int(total >= 2), total % 2]
 
 def my_add(a, b):
-    
-    len_a = len(a)
-    len_b = len(b)
-    if len_a < len_b:
-        return my_add(b, a)
-    carry = [0 for i in range(len_a + 1)]
-    result = []
-    len_difference = len_a - len_b
-    for i in range(len_a):
-        new_b = [*[0 for k in range(len_difference)], *b]
-        bit_add = my_bit_add(a[len_a - 1 - i], new_b[len_a - 1 - i], carry[i])
-        result.append(bit_add[1])
-        carry[i+1] = bit_add[0]
-    result.append(carry[len_a])
-
-    correct_order = list(reversed(result))
-    return correct_order[correct_order.index(1):]
+    return (BitVector.from_bits(a) + BitVector.from_bits(b)).to_bits()
 
 
 def my_not(a):
     return [not i for i in a]
 
+# A negative number is written with its first bit negated: -5 = [-1, 0, 1]
 def my_negative(a):
-    return [-1*a[0], *[a[1:]]]
+    return [-1*a[0], *a[1:]]
 
 """
 a and b are lists that begin with 1
-
-Uses a - b = a + not(b) + 1
 """
 def subtract(a, b):
-    len_a = len(a)
-    len_b = len(b)
-    if len_a < len_b:
-        return my_negative(subtract(b, a))
-    
-    
+    a, b = BitVector.from_bits(a), BitVector.from_bits(b)
+    if a < b:
+        return my_negative((b - a).to_bits())
+    return (a - b).to_bits()
 
-    return my_add(my_add(a, [1]), my_not(b))
 """
 Both number and divisor are lists
+Returns: quotient, remainder (as lists)
 """
 def long_division(dividend, divisor):
-    quotient = [0]
-
-    if divisor == [0]:
-        raise ValueError('Cannot divide by zero')
-    if greater_than(divisor, dividend):
-        return quotient, dividend
-    if divisor == dividend:
-        return 1, 0
-    remainder = dividend
-    while greater_than(remainder, divisor) or remainder == divisor:
-        remainder = subtract(remainder, divisor)
-        quotient = my_add(quotient, [1])
-    return remainder, quotient
+    quotient, remainder = divmod(BitVector.from_bits(dividend), BitVector.from_bits(divisor))
+    return quotient.to_bits(), remainder.to_bits()
 
 
 def find_path_number(grid_size):
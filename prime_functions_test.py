@@ -1,4 +1,5 @@
 import unittest
+import prime_functions
 from prime_functions import *
 
 class LargestPrimeTestCase(unittest.TestCase):
@@ -25,19 +26,51 @@ class LargestPrimeTestCase(unittest.TestCase):
 
         self.assertEqual(max(prime_factors(600851475143)), 6857)
 
+    def test_factorize(self):
+        with self.assertRaises(ValueError):
+            factorize(-1)
+        self.assertEqual(factorize(1), [])
+        self.assertEqual(factorize(360), [(2, 3), (3, 2), (5, 1)])
+        self.assertEqual(factorize(2**64 - 1), [(3, 1), (5, 1), (17, 1), (257, 1), (641, 1), (65537, 1), (6700417, 1)])
+        self.assertEqual(factorize(4294967279 * 4294967291), [(4294967279, 1), (4294967291, 1)])
+        self.assertEqual(factorize((2**31 - 1) * (2**61 - 1)), [(2**31 - 1, 1), (2**61 - 1, 1)])
+
+    def test_is_prime(self):
+        self.assertEqual([n for n in range(30) if is_prime(n)], [2, 3, 5, 7, 11, 13, 17, 19, 23, 29])
+        self.assertTrue(is_prime(2**61 - 1))
+        self.assertFalse(is_prime(3215031751))
+
     @unittest.expectedFailure
     def test_prime_factors_3(self):
         prime_factors(2, primes=[])
         self.assertEqual([2, 3], prime_factors(3))
 
     def test_all_divisors(self):
-        self.assertEqual(all_divisors(-4), set([-1, 2, 4]))
+        self.assertEqual(all_divisors(-4), set([1, 2, 4]))
         self.assertEqual(all_divisors(0), set([]))
         self.assertEqual(all_divisors(1), set([1]))
         self.assertEqual(all_divisors(3), set([1, 3]))
         self.assertEqual(all_divisors(6), set([1, 2, 3, 6]))
         self.assertEqual(all_divisors(28), set([1,2,4,7,14,28]))
 
+    def test_iter_divisors(self):
+        self.assertEqual(list(iter_divisors(0)), [])
+        self.assertEqual(list(iter_divisors(1, ordered=True)), [1])
+        self.assertEqual(list(iter_divisors(360, ordered=True)), sorted(iter_divisors(360)))
+        self.assertEqual(list(iter_divisors(-12, ordered=True)), [1, 2, 3, 4, 6, 12])
+
+        # Highly composite, 6720 divisors
+        divisors = list(iter_divisors(963761198400, ordered=True))
+        self.assertEqual(len(divisors), 6720)
+        self.assertEqual(divisors, sorted(set(divisors)))
+
+    def test_divisor_count_and_sum(self):
+        self.assertEqual(divisor_count(0), 0)
+        self.assertEqual(divisor_count(28), 6)
+        self.assertEqual(divisor_sum(28), 56)
+        self.assertEqual(divisor_count(963761198400), 6720)
+        self.assertEqual(divisor_sum(-6), 12)
+
     def test_natural_numbers(self):
         n = natural_number_generator()
         ns = [next(n) for i in range(5)]
@@ -51,10 +84,22 @@ class LargestPrimeTestCase(unittest.TestCase):
     def test_triangle_divisors(self):
         self.assertEqual(triangle_divisors(5), 28)
     
-    @unittest.skip('Takes too long')
     def test_triangle_divisors_500(self):
         self.assertEqual(triangle_divisors(500), 76576500)
 
+    def test_divisor_function_sieve(self):
+        sieve = divisor_function_sieve(13)
+        self.assertEqual(list(sieve.spf), [0, 1, 2, 3, 2, 5, 2, 7, 2, 3, 2, 11, 2])
+        self.assertEqual(list(sieve.sigma0), [0, 1, 2, 2, 3, 2, 4, 2, 4, 3, 4, 2, 6])
+        self.assertEqual(list(sieve.sigma1), [0, 1, 3, 4, 7, 6, 12, 8, 15, 13, 18, 12, 28])
+        self.assertEqual(list(sieve.phi), [0, 1, 1, 2, 2, 4, 2, 6, 4, 6, 4, 10, 4])
+        self.assertEqual(list(sieve.mobius), [0, 1, -1, -1, 0, -1, 1, -1, 0, 0, 1, -1, 0])
+
+        sieve = divisor_function_sieve(10**4)
+        for k in [360, 9973, 9999]:
+            self.assertEqual(sieve.sigma0[k], len(all_divisors(k)))
+            self.assertEqual(sieve.sigma1[k], sum(all_divisors(k)))
+
     def test_smallest_multiple(self):
         self.assertEqual(1, smallest_multiple(1))
         self.assertEqual(2, smallest_multiple(2))
@@ -73,7 +118,6 @@ class LargestPrimeTestCase(unittest.TestCase):
         expected_first_six = [2, 3, 5, 7, 11, 13]
         self.assertEqual(expected_first_six, first_six)
 
-    @unittest.skip('Takes too long')
     def test_generate_10001_prime(self):
         new_gen = generate_primes()
         for i in range(10000):
@@ -81,10 +125,36 @@ class LargestPrimeTestCase(unittest.TestCase):
 
         self.assertEqual(104743, next(new_gen))
 
+    def test_generate_millionth_prime(self):
+        new_gen = generate_primes()
+        for i in range(999999):
+            next(new_gen)
+
+        self.assertEqual(15485863, next(new_gen))
+
+    def test_nth_prime(self):
+        with self.assertRaises(ValueError):
+            nth_prime(0)
+        self.assertEqual([nth_prime(k) for k in range(1, 8)], [2, 3, 5, 7, 11, 13, 17])
+        self.assertEqual(nth_prime(10001), 104743)
+        self.assertEqual(nth_prime(10**6), 15485863)
+
     def test_sum_of_primes(self):
         self.assertEqual(sum_primes_below(10), 17)
         self.assertEqual(sum_primes_below(2*10**6), 142913828922)
 
+    def test_segmented_sieve(self):
+        self.assertEqual(list(sieve_of_erastothenes(2)), [])
+        self.assertEqual(list(sieve_of_erastothenes(3)), [2])
+        primes = sieve_of_erastothenes(10**5)
+        self.assertEqual(list(sieve_of_erastothenes(10**5, segment_size=1000)), list(primes))
+        self.assertEqual(list(sieve_of_erastothenes(10**5, lo=500, segment_size=7)), list(primes[primes >= 500]))
+        self.assertEqual(list(sieve_of_erastothenes(10**10 + 100, lo=10**10)), [10000000019, 10000000033, 10000000061, 10000000069, 10000000097])
+
+        segments = list(sieve_segments(10**5, segment_size=1000))
+        self.assertTrue(all(len(s) <= 1000 for s in segments))
+        self.assertEqual(list(np.concatenate(segments)), list(primes))
+
     def test_largest_product(self):
         number_list = []
         with open('thousand_digit_number.txt') as large_number_reader:
@@ -94,14 +164,57 @@ class LargestPrimeTestCase(unittest.TestCase):
         self.assertEqual((5832, [9, 9, 8, 9]), largest_product_in_series(number_list, 4))
         self.assertEqual((23514624000, [5, 5, 7, 6, 6, 8, 9, 6, 6, 4, 8, 9, 5]), largest_product_in_series(number_list, 13))
 
+    def test_largest_product_from_buffer(self):
+        digits = read_digits('thousand_digit_number.txt')
+        self.assertEqual(len(digits), 1000)
+        self.assertEqual((23514624000, [5, 5, 7, 6, 6, 8, 9, 6, 6, 4, 8, 9, 5]), largest_product_in_series(digits, 13))
+        with open('thousand_digit_number.txt', 'rb') as large_number_reader:
+            self.assertEqual(5832, largest_product_in_series(large_number_reader.read(), 4)[0])
+
+        # The last window counts, zeros rule windows out, and products are exact past int64
+        self.assertEqual((72, [9, 8]), largest_product_in_series('1011098', 2))
+        self.assertEqual((0, []), largest_product_in_series('1020', 2))
+        self.assertEqual(9**40, largest_product_in_series('9' * 40, 40)[0])
+
     def test_pythagorean_triplet(self):
         self.assertEqual(pythagorean_triplet(12), (3*4*5, 3, 4, 5))
 
         self.assertEqual(pythagorean_triplet(1000), (31875000, 200, 375, 425))
+        self.assertIsNone(pythagorean_triplet(11))
+
+    def test_triples_with_perimeter(self):
+        self.assertEqual(triples_with_perimeter(120), [(20, 48, 52), (24, 45, 51), (30, 40, 50)])
+        self.assertEqual(triples_with_perimeter(121), [])
+        self.assertEqual(sorted(primitive_triples(40)), [(3, 4, 5), (5, 12, 13), (8, 15, 17)])
+
+    def test_triangle_perimeter_counts(self):
+        counts = triangle_perimeter_counts(1000)
+        self.assertEqual(counts[120], 3)
+        self.assertEqual([p for p in range(1001) if counts[p] != len(triples_with_perimeter(p))], [])
+        self.assertEqual(most_triangle_solutions(1000), 840)
 
     def test_palindrome_product(self):
         self.assertEqual(palindrome_product(2), 9009)
         self.assertEqual(palindrome_product(3), 906609)
+        self.assertEqual(palindrome_product(4), 99000099)
+
+    def test_largest_palindrome_in(self):
+        for lo, hi in [(1, 106), (1, 10), (10, 100), (1, 1000), (90, 320), (300, 1001), (500, 1000)]:
+            expected = max([i * j for i in range(lo, hi) for j in range(1, i + 1) if check_palindrome(i * j)] + [0])
+            self.assertEqual(prime_functions._largest_palindrome_in(lo, hi), expected)
+
+    def test_palindrome_product_top_down(self):
+        self.assertEqual(palindrome_product(1, top_down=True), palindrome_product(1))
+        self.assertEqual(palindrome_product(3, top_down=True), 906609)
+        self.assertEqual(palindrome_product(6, top_down=True), 999000000999)
+        self.assertEqual(palindrome_product(7, top_down=True), 99956644665999)
+
+    def test_check_palindrome(self):
+        self.assertTrue(check_palindrome(0))
+        self.assertTrue(check_palindrome(9009))
+        self.assertTrue(check_palindrome(12321))
+        self.assertFalse(check_palindrome(9010))
+        self.assertFalse(check_palindrome(-11))
 
     def test_grid_product(self):
         grid = []
@@ -110,6 +223,27 @@ class LargestPrimeTestCase(unittest.TestCase):
                 grid.append(list(map(int, line.strip().split(' '))))
 
         self.assertEqual(grid_product(grid), 70600674)
+        self.assertEqual(grid_product_location(grid), (70600674, 12, 6, 'diagonal_left'))
+        self.assertEqual(grid_product(grid, k=1), 99)
+        self.assertEqual(grid_product_location(grid, k=21), (0, None, None, None))
+
+    def test_grid_product_edges(self):
+        # Windows touching the last row and column count
+        grid = [[1, 1, 1, 1, 1],
+                [1, 1, 1, 1, 2],
+                [1, 1, 1, 1, 3],
+                [1, 1, 1, 1, 4],
+                [1, 1, 1, 1, 5]]
+        self.assertEqual(grid_product_location(grid), (120, 1, 4, 'down'))
+        grid = [[9, 0], [0, 9]]
+        self.assertEqual(grid_product_location(grid, k=2), (81, 0, 0, 'diagonal_right'))
+
+        # Products past int64 are still exact
+        self.assertEqual(grid_product([[10**6] * 4], k=4), 10**24)
+        # ... including between windows whose float logs are equal
+        big = 10**16
+        self.assertEqual(grid_product_location([[big, big], [big + 3, big + 3]], 2), ((big + 3)**2, 1, 0, 'right'))
+        self.assertEqual(grid_product_location([[0, 10**10], [0, 0]], 2), (0, 0, 0, 'right'))
 
     def test_fifty_digit(self):
         numbers = []
@@ -117,12 +251,21 @@ class LargestPrimeTestCase(unittest.TestCase):
             for line in nums:
                 numbers.append(list(map(int, line.strip())))
         self.assertEqual(first_ten_large_nums(numbers, 11), 5537376230342)
+        self.assertEqual(first_digits_of_sum('50_digit_nums.txt'), 5537376230)
         # print('\n', first_ten_large_nums(numbers, 13))
         # print(first_ten_large_nums(numbers, 10))
         # print(first_ten_large_nums(numbers, 8))
         # print(first_ten_large_nums(numbers, 15))
         # print(first_ten_large_nums(numbers, 12))
 
+    def test_first_digits_of_sum(self):
+        self.assertEqual(first_digits_of_sum(['1\n', '99\n', '5\n'], k=2), 10)
+        self.assertEqual(first_digits_of_sum([b'999', b'1'], k=1), 1)
+        self.assertEqual(first_digits_of_sum(['9' * 60] * 1000, k=12), int(str(int('9' * 60) * 1000)[:12]))
+
+        column_sums, count = large_nums_column_sums(['12', '345'])
+        self.assertEqual((list(column_sums), count), ([7, 5, 3], 2))
+
     def test_collatz_sequence(self):
         c1 = collatz_sequence(1)
         self.assertEqual([1], [i for i in c1])
@@ -136,10 +279,38 @@ class LargestPrimeTestCase(unittest.TestCase):
     def test_find_longest_collatz2(self):
         self.assertEqual(find_longest_collatz_under(10**6), (837799, 525))
 
-    @unittest.skip('Takes about 13 seconds to run')
     def test_find_longest_collatz3(self):
         self.assertEqual(find_longest_collatz_under(10**7), (8400511, 686))
 
+    def test_collatz_lengths(self):
+        lengths = collatz_lengths(1000)
+        self.assertEqual(lengths.dtype, np.int32)
+        self.assertEqual(list(lengths), list(collatz_lengths(1000, batch=False)))
+        for k in [1, 2, 13, 27, 999]:
+            self.assertEqual(lengths[k], len(list(collatz_sequence(k))))
+        self.assertEqual(find_longest_collatz_under(10**5, batch=False), find_longest_collatz_under(10**5))
+
+    def test_collatz_base_table_is_reused(self):
+        table = prime_functions._cached_collatz_lengths(1000)
+        self.assertIs(prime_functions._cached_collatz_lengths(1000), table)
+        self.assertEqual(prime_functions._longest_collatz_in(1000, 2000, 1000), find_longest_collatz_under(2000))
+
+    def test_split_range(self):
+        self.assertEqual(split_range(0, 10, 3), [(0, 3), (3, 6), (6, 10)])
+        self.assertEqual(split_range(5, 7, 4), [(5, 6), (6, 7)])
+
+    def test_divisor_counts(self):
+        self.assertEqual(list(divisor_counts(0, 13)), [0, 1, 2, 2, 3, 2, 4, 2, 4, 3, 4, 2, 6])
+        self.assertEqual(list(divisor_counts(10**12, 10**12 + 3)), [divisor_count(k) for k in range(10**12, 10**12 + 3)])
+
+    def test_parallel_searches(self):
+        self.assertEqual(sum_primes_below(2*10**6, workers=2), 142913828922)
+        self.assertEqual(triangle_divisors(500, workers=2), 76576500)
+        self.assertEqual(palindrome_product(2, workers=2), 9009)
+        self.assertEqual(palindrome_product(5, workers=2), palindrome_product(5))
+        self.assertEqual(find_longest_collatz_under(10, workers=2), (9, 20))
+        self.assertEqual(find_longest_collatz_under(2*10**6, workers=2), find_longest_collatz_under(2*10**6))
+
     def test_find_all_paths(self):
         self.assertEqual([[0, 1, 2], [0, 1, 2], [0, 1, 2]], construct_grid(2))
         grid = construct_grid(2)
@@ -160,7 +331,58 @@ class LargestPrimeTestCase(unittest.TestCase):
 
         self.assertEqual(137846528820, find_path_number(20))
 
+    def test_lattice_paths(self):
+        indptr, indices = lattice_adjacency(2)
+        matrix = create_adjacency_matrix(construct_grid(2))
+        for node in range(9):
+            self.assertEqual(list(indices[indptr[node]:indptr[node + 1]]), [i for i in range(9) if matrix[node][i]])
+        self.assertEqual(list(iter_lattice_paths(2)), dfs(matrix, 0, [0]))
+
+        self.assertEqual(count_lattice_paths(20), find_path_number(20))
+        self.assertEqual(count_lattice_paths(2, 3), 10)
+        self.assertEqual(count_lattice_paths(2, blocked=[(1, 1)]), 2)
+        self.assertEqual(list(iter_lattice_paths(1, blocked=[(0, 1)])), [[0, 2, 3]])
+        self.assertEqual(count_lattice_paths(1, blocked=[(1, 1)]), 0)
+
+    def test_min_path_sum(self):
+        matrix = [[131, 673, 234, 103, 18],
+                  [201, 96, 342, 965, 150],
+                  [630, 803, 746, 422, 111],
+                  [537, 699, 497, 121, 956],
+                  [805, 732, 524, 37, 331]]
+        self.assertEqual(min_path_sum(matrix), 2427)
+        self.assertEqual(min_path_sum([[1, 9], [1, 1]], blocked=[(1, 0)]), 11)
+        self.assertIsNone(min_path_sum([[1, 9], [1, 1]], blocked=[(1, 0), (0, 1)]))
+        self.assertEqual(min_path_sum([[1.5, 9], [1, 1]]), 3.5)
+        self.assertEqual(min_path_sum([[-5, 1], [2, -4]]), -8)
+
+        # Integer sums past 2^53, and past int64, are exact
+        self.assertEqual(min_path_sum([[2**53 + 1]]), 2**53 + 1)
+        self.assertEqual(min_path_sum([[10**17 + 1, 1], [1, 1]]), 10**17 + 3)
+        self.assertEqual(min_path_sum([[2**62, 2**62], [2**62, 1]], blocked=[(1, 0)]), 2**63 + 1)
+
     def test_my_add(self):
         self.assertEqual(my_add([1, 0, 0, 1], [1, 0]), [1, 0, 1, 1])
         self.assertEqual(subtract([1, 0, 1, 0], [1, 1]), [1, 1, 1])
+        self.assertEqual(subtract([1, 1], [1, 0, 1, 0]), [-1, 1, 1])
+        self.assertEqual(subtract([1, 1], [1, 1]), [0])
+
+    def test_greater_than(self):
+        self.assertTrue(greater_than([1, 1, 0], [1, 0, 1]))
+        self.assertFalse(greater_than([1, 0, 1], [1, 1, 0]))
+        self.assertFalse(greater_than([1, 0], [1, 0]))
+
+    def test_long_division(self):
+        with self.assertRaises(ValueError):
+            long_division([1, 0], [0])
+        self.assertEqual(long_division([1, 1, 0, 1], [1, 0]), ([1, 1, 0], [1]))
+        self.assertEqual(long_division([1, 0], [1, 1, 1]), ([0], [1, 0]))
+        self.assertEqual(long_division([1, 1], [1, 1]), ([1], [0]))
+
+    def test_bit_vector(self):
+        self.assertEqual(BitVector.from_bits([1, 0, 1, 1]), BitVector(11))
+        self.assertEqual(BitVector(11).to_bits(), [1, 0, 1, 1])
+        self.assertEqual(len(BitVector(11)), 4)
+        x, y = 3**5000, 7**1000
+        self.assertEqual(divmod(BitVector(x), BitVector(y)), (BitVector(x // y), BitVector(x % y)))
 